@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from Deck import parse_hand
+from PokerBot import PokerBot, check_opponents
+
+
+# one scenario per input line (JSON), e.g.
+# {"id": 7, "hole": ["As", "Kd"], "board": ["Qs", "Js", "2h"], "opponents": 2, "simulations": 5000}
+# - hole: 2 cards, board: 0/ 3/ 4/ 5 cards (strings like "A♠"/ "As" or integers 0-51)
+# - opponents (1 to 8), simulations (rollout budget) and time_limit (seconds) are optional, null lifts that limit
+#   (at least one of the two budgets has to be left)
+# one result per output line in input order:
+# {"id": 7, "line": 1, "equity": 0.61, "decision": "stay", "method": "mcts", "simulations": 5000, "interval": [...]}
+# or {"id": 7, "line": 1, "error": "..."} for a scenario that can't be scored
+
+_bot = None  # one bot per worker process
+
+
+def init_worker(simulations, time_limit, seed):
+    """creates the worker process' bot with the batch defaults"""
+    global _bot
+    _bot = PokerBot()
+    _bot.simulation_limit = simulations
+    _bot.simulation_time_limit = time_limit
+    _bot.seed = seed
+
+
+def parse_scenario(scenario):
+    """checked (hole cards, board cards, number of opponents) of a scenario dict, raises ValueError for an
+    impossible one"""
+    if not isinstance(scenario, dict):
+        raise ValueError("A scenario must be a JSON object")
+    my_hand = parse_hand(scenario["hole"])
+    revealed_cards = parse_hand(scenario.get("board", []))
+    if len(my_hand) != 2 or len(revealed_cards) not in (0, 3, 4, 5):
+        raise ValueError("Need 2 hole cards and 0, 3, 4 or 5 board cards")
+    if len(set(my_hand + revealed_cards)) != len(my_hand) + len(revealed_cards):
+        raise ValueError("Duplicate cards")
+    num_opponents = scenario.get("opponents", 1)
+    check_opponents(my_hand, revealed_cards, num_opponents)  # more than the deck can deal would never finish
+    return my_hand, revealed_cards, num_opponents
+
+
+def score_scenario(line_number, line):
+    """scores one JSONL scenario with the worker's bot, returns the JSON result line"""
+    result = {"line": line_number}
+    try:
+        scenario = json.loads(line)
+        if isinstance(scenario, dict):
+            result["id"] = scenario.get("id")
+        my_hand, revealed_cards, num_opponents = parse_scenario(scenario)
+
+        bot = _bot
+        simulation_limit, simulation_time_limit, seed = bot.simulation_limit, bot.simulation_time_limit, bot.seed
+        simulations = scenario.get("simulations", simulation_limit)
+        time_limit = scenario.get("time_limit", simulation_time_limit)
+        if simulations is None and time_limit is None:
+            raise ValueError("Need a rollout budget: simulations and time_limit can't both be null")
+        bot.simulation_limit, bot.simulation_time_limit = simulations, time_limit
+        if seed is not None:
+            bot.seed = "%s:%d" % (seed, line_number)  # reproducible per line whatever worker scores it
+        try:
+            decision = bot.decide(my_hand, revealed_cards, num_opponents)
+        finally:
+            bot.simulation_limit, bot.simulation_time_limit, bot.seed = simulation_limit, simulation_time_limit, seed
+
+        report = bot.last_report
+        result.update(equity=report.win_rate, decision=decision, method=report.method,
+                      simulations=report.simulations, interval=list(report.interval))
+    except (ValueError, KeyError, TypeError, AssertionError) as error:
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+    return json.dumps(result)
+
+
+def score_stream(lines, workers=1, simulations=10000, time_limit=None, seed=None, window=None):
+    """scores JSONL scenario lines, yields JSON result lines in input order
+    at most `window` scenarios (default 4 per worker) are in flight, so memory stays bounded for any input size"""
+
+    scenarios = ((line_number, line) for line_number, line in enumerate(lines, 1) if line.strip())
+    if workers <= 1:
+        init_worker(simulations, time_limit, seed)
+        for line_number, line in scenarios:
+            yield score_scenario(line_number, line)
+        return
+
+    window = window or 4 * workers
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(simulations, time_limit, seed)) as pool:
+        in_flight = deque()
+        for line_number, line in scenarios:
+            in_flight.append(pool.submit(score_scenario, line_number, line))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="score JSONL poker scenarios (equity and stay/ fold) in batch")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL scenarios file (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--simulations", type=int, default=10000, help="default rollout budget per scenario")
+    parser.add_argument("--time-limit", type=float, default=None, help="default seconds per scenario")
+    parser.add_argument("--seed", type=int, default=None, help="master seed (results reproducible per line)")
+    parser.add_argument("--window", type=int, default=None, help="max scenarios in flight (default 4 per worker)")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for result in score_stream(source, args.workers, args.simulations, args.time_limit, args.seed, args.window):
+            sink.write(result + "\n")
+            sink.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from itertools import combinations, cycle
+from Evaluator import PartialHand, evaluate_hand, hand_strength
+from Deck import CardSet, Deck
+from PokerBot import PokerBot
+from Sampling import SAMPLING_MODES
+from PreflopTable import preflop_equity
+
+
+# hand rank names (Evaluator.py numeric breakdown)
+CATEGORY_NAMES = ["high_card", "pair", "two_pairs", "triple", "straight", "flush", "full_house", "four_of_a_kind",
+                  "straight_flush", "royal_flush"]
+
+# equity references for accuracy checks: (name, my hand, revealed cards, equity against a random hand)
+# preflop values are well known, flop values are enumerated exactly (PokerBot.exact_win_rate)
+REFERENCES = [
+    ("preflop_AA", [51, 38], [], 0.8520),
+    ("preflop_72o", [5, 13], [], 0.3458),
+    ("flop_AKs_345c", [51, 50], [1, 2, 3], 0.4152),
+    ("flop_AKs_QJ3", [51, 50], [49, 48, 1], 0.7626),
+]
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results.json")
+
+
+def result(value, unit, higher_is_better=True):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def rate(function, duration):
+    """calls function repeatedly for about `duration` seconds, returns calls per second"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(100):
+            function()
+        calls += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return calls / elapsed
+
+
+def category_hands(category, count, rng):
+    """random 7 card hands of a given hand rank"""
+    hands = []
+    while len(hands) < count:
+        if category >= 8:  # too rare to find by sampling: build the straight flush and add 2 random cards
+            card_suit = rng.randrange(4)
+            high = 12 if category == 9 else rng.randrange(3, 12)
+            straight = [13 * card_suit + (high - i) % 13 for i in range(5)]
+            hand = straight + rng.sample([card for card in range(52) if card not in straight], 2)
+        else:
+            hand = rng.sample(range(52), 7)
+        if evaluate_hand(hand)[0] == category:
+            hands.append(hand)
+    return hands
+
+
+def bench_evaluator(duration, rng):
+    """evaluate_hand (decoded) and hand_strength calls per second for every hand rank"""
+    results = {}
+    for category, name in enumerate(CATEGORY_NAMES):
+        hands = category_hands(category, 100, rng)
+        next_hand = cycle(hands).__next__
+        results["evaluate_hand_%s" % name] = result(rate(lambda: evaluate_hand(next_hand()), duration / 2), "calls/s")
+        results["hand_strength_%s" % name] = result(rate(lambda: hand_strength(next_hand()), duration / 2), "calls/s")
+    return results
+
+
+def bench_deck(duration, rng):
+    """deck construction, draws and samples per second"""
+    deck = Deck(rng)
+    deck.remove_cards([51, 50, 49, 48, 1])  # flop decision: 47 cards left
+    excluded = CardSet([2, 3])  # sampled opponent hand
+    return {
+        "deck_new": result(rate(lambda: Deck(rng), duration), "decks/s"),
+        "deck_draw_9": result(rate(lambda: Deck(rng).draw(9), duration), "deals/s"),
+        "deck_sample_2": result(rate(lambda: deck.sample(2), duration), "samples/s"),
+        "deck_sample_2_exclude": result(rate(lambda: deck.sample(2, excluded), duration), "samples/s"),
+    }
+
+
+def bench_bot():
+    """bot with MCTS only: no preflop table, no exact enumeration, no early stopping, seeded"""
+    bot = PokerBot()
+    bot.use_preflop_table = False
+    bot.enumeration_budget = 0
+    bot.confidence = None
+    bot.seed = 480
+    return bot
+
+
+def bench_decide(duration, rng):
+    """MCTS rollouts per second on every street and exact enumeration time on the turn and river"""
+    bot = bench_bot()
+    results = {}
+    streets = [("preflop", []), ("flop", [49, 48, 1]), ("turn", [49, 48, 1, 15]), ("river", [49, 48, 1, 15, 30])]
+    for street, revealed_cards in streets:
+        start = time.perf_counter()
+        wins, visits, simulations, phase_times = bot.run_rollouts([51, 50], revealed_cards, time.time() + duration, rng)
+        results["rollouts_%s" % street] = result(simulations / (time.perf_counter() - start), "rollouts/s")
+
+    for street, revealed_cards in streets[2:]:
+        start = time.perf_counter()
+        bot.exact_win_rate([51, 50], revealed_cards)
+        results["exact_%s" % street] = result(time.perf_counter() - start, "s", higher_is_better=False)
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        preflop_equity([51, 50])
+    results["preflop_table_lookup"] = result(1000 / (time.perf_counter() - start), "lookups/s")
+    return results
+
+
+def bench_accuracy(simulations):
+    """absolute error of the MCTS win rate against reference equities with a fixed rollout budget"""
+    bot = bench_bot()
+    bot.simulation_time_limit = None
+    bot.simulation_limit = simulations
+    results = {}
+    for name, my_hand, revealed_cards, reference in REFERENCES:
+        results["error_%s" % name] = result(abs(bot.mcts_win_rate(my_hand, revealed_cards) - reference), "abs error",
+                                            higher_is_better=False)
+    return results
+
+
+def outcome_variance(my_hand, revealed_cards):
+    """exact variance of a single uniform rollout's result (win 1, tie 0.5, loss 0) over every runout and
+    opponent hand, a uniform estimate from n rollouts has variance outcome_variance / n"""
+    known_cards = CardSet(my_hand + revealed_cards)
+    remaining_cards = list(known_cards.complement())
+    my_partial = PartialHand(my_hand + revealed_cards)
+    board_partial = PartialHand(revealed_cards)
+    outcomes = wins = squares = 0
+    for runout in combinations(remaining_cards, 5 - len(revealed_cards)):
+        my_strength = my_partial.strength(runout)
+        board = board_partial.extend(runout)
+        for opponent_hand in combinations([card for card in remaining_cards if card not in runout], 2):
+            opponent_strength = board.strength(opponent_hand)
+            if my_strength > opponent_strength:
+                wins += 1
+                squares += 1
+            elif my_strength == opponent_strength:
+                wins += 0.5
+                squares += 0.25
+            outcomes += 1
+    return squares / outcomes - (wins / outcomes) ** 2
+
+
+def bench_variance(simulations, repeats):
+    """variance reduction of every sampling mode on the flop references: exact variance of plain uniform sampling
+    divided by the mean squared error of `repeats` independently seeded estimates with a fixed rollout budget
+    = how many times fewer rollouts the mode needs for the same interval width than plain uniform sampling"""
+    bot = bench_bot()
+    bot.enumeration_budget = PokerBot().enumeration_budget  # control mode enumerates our strength over the runouts
+    bot.simulation_time_limit = None
+    bot.simulation_limit = simulations
+    results = {}
+    for name, my_hand, revealed_cards, reference in REFERENCES:
+        if not revealed_cards:
+            continue
+        uniform_variance = outcome_variance(my_hand, revealed_cards) / simulations
+        for mode in SAMPLING_MODES:
+            if mode == "uniform":
+                continue  # the reference, known exactly
+            bot.sampling = mode
+            squared_errors = 0
+            for repeat in range(repeats):
+                bot.seed = 480 + repeat
+                squared_errors += (bot.mcts_win_rate(my_hand, revealed_cards) - reference) ** 2
+            results["variance_reduction_%s_%s" % (mode, name)] = result(
+                uniform_variance / max(squared_errors / repeats, 1e-12), "x fewer rollouts")
+    return results
+
+
+def run_benchmarks(duration=1.0, simulations=50000, seed=480, variance_simulations=5000, variance_repeats=60):
+    rng = random.Random(seed)
+    results = {}
+    results.update(bench_evaluator(duration, rng))
+    results.update(bench_deck(duration, rng))
+    results.update(bench_decide(duration, rng))
+    results.update(bench_accuracy(simulations))
+    results.update(bench_variance(variance_simulations, variance_repeats))
+    return results
+
+
+def compare(results, baseline, tolerance, error_slack):
+    """compares results with a baseline
+    throughput may drop by at most `tolerance` (fraction), errors/ times may grow by at most `tolerance` or `error_slack`
+    returns a list of regression messages"""
+    regressions = []
+    for name, base in sorted(baseline.items()):
+        if name not in results:
+            regressions.append("%s: missing from results" % name)
+            continue
+        value, base_value = results[name]["value"], base["value"]
+        if base["higher_is_better"]:
+            if value < base_value * (1 - tolerance):
+                regressions.append("%s: %.4g %s < baseline %.4g" % (name, value, base["unit"], base_value))
+        elif value > max(base_value * (1 + tolerance), base_value + error_slack):
+            regressions.append("%s: %.4g %s > baseline %.4g" % (name, value, base["unit"], base_value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the evaluator, deck and bot against a stored baseline")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds per throughput measurement")
+    parser.add_argument("--simulations", type=int, default=50000, help="rollouts per accuracy check")
+    parser.add_argument("--variance-simulations", type=int, default=5000, help="rollouts per variance estimate")
+    parser.add_argument("--variance-repeats", type=int, default=60, help="seeded estimates per sampling mode")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="save these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative slowdown")
+    parser.add_argument("--error-slack", type=float, default=0.01, help="allowed absolute growth of errors/ times")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.duration, args.simulations, variance_simulations=args.variance_simulations,
+                             variance_repeats=args.variance_repeats)
+    report = {"machine": platform.platform(), "python": platform.python_version(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, measurement in sorted(results.items()):
+        print("%-36s %14.4g %s" % (name, measurement["value"], measurement["unit"]))
+    print("wrote", args.output)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print("saved baseline", args.baseline)
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    except OSError:
+        print("no baseline at %s, run with --update-baseline" % args.baseline)
+        return 1
+
+    regressions = compare(results, baseline, args.tolerance, args.error_slack)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    print("%d regressions against %s" % (len(regressions), args.baseline))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,411 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from heapq import heappop, heappush
+from itertools import count
+from statistics import NormalDist
+from BatchEquity import parse_scenario
+from Deck import COMBOS
+from PokerBot import STREETS, DecisionReport, PokerBot, check_opponents, combo_win_rate, random_setup, wilson_interval
+
+
+# local decision service: one JSON request per line over TCP (localhost) or a unix socket, e.g.
+# {"id": 7, "hole": ["As", "Kd"], "board": ["Qs", "Js", "2h"], "opponents": 2, "deadline_ms": 250}
+# - hole/ board/ opponents as in BatchEquity, simulations (rollout budget) is optional
+# - deadline_ms: time allowed from receiving the request (default: the bot's simulation_time_limit)
+# one response line per request, in completion order (match them by id):
+# {"id": 7, "equity": 0.61, "decision": "stay", "method": "mcts", "simulations": 18000, "interval": [...],
+#  "elapsed_ms": 249.1}
+# or {"id": 7, "error": "..."}
+# every request gets exactly one response line, a failure anywhere while working on it becomes an error response
+#
+# rollouts run in short slices (`slice_simulations` rollouts or `slice_time` seconds) on a process pool, the request closest to its deadline gets the
+# next free worker (earliest deadline first), a request is answered as soon as its decision is settled, its budget
+# is used up or its deadline hits (with the estimate merged from the slices finished by then)
+
+_bot = None  # one bot per worker process
+
+
+def init_worker(bot):
+    """worker process' bot: the parent's settings, early stopping is done on the merged slices instead"""
+    global _bot
+    _bot = bot
+    _bot.confidence = None
+
+
+def warm_up(seconds):
+    """keeps a worker busy for a moment so the pool starts all of them"""
+    time.sleep(seconds)
+
+
+def rollout_slice(my_hand, revealed_cards, num_opponents, deadline, seed, simulations):
+    """runs one slice of rollouts, returns (wins per opponent combo, visits per opponent combo, simulations)"""
+    wins, visits, simulations, _ = _bot.run_rollouts(my_hand, revealed_cards, deadline, random.Random(seed),
+                                                     simulations, False, num_opponents)
+    return wins, visits, simulations
+
+
+def exact_slice(my_hand, revealed_cards):
+    """enumerates the exact win rate, returns (win rate, outcomes)"""
+    return _bot.exact_win_rate(my_hand, revealed_cards)
+
+
+class DecisionJob:
+    """one decision request in the scheduler: absolute deadline and the rollout stats merged so far"""
+
+    def __init__(self, my_hand, revealed_cards, num_opponents, deadline, budget, future):
+        self.my_hand = my_hand
+        self.revealed_cards = revealed_cards
+        self.num_opponents = num_opponents
+        self.deadline = deadline  # time.time() value
+        self.budget = budget  # max rollouts (math.inf = until the deadline)
+        self.future = future  # resolved with the DecisionReport
+        self.report = DecisionReport(STREETS.get(len(revealed_cards), "street with %d cards" % len(revealed_cards)),
+                                     num_opponents)
+        self.start = time.perf_counter()
+        self.exact = False  # enumerated in a single slice instead of rollouts
+        self.wins = array("d", bytes(8 * len(COMBOS)))
+        self.visits = array("d", bytes(8 * len(COMBOS)))
+        self.simulations = 0  # rollouts merged
+        self.scheduled = 0  # rollouts handed to workers (merged or in flight)
+        self.queued = False  # waiting in the scheduler's heap
+        self.timer = None  # answers at the deadline
+
+
+class DecisionService:
+    """schedules decision requests with per request deadlines on a pool of rollout worker processes"""
+
+    def __init__(self, bot=None, workers=1, slice_simulations=2000, slice_time=0.01, seed=None):
+        self.bot = bot if bot is not None else PokerBot()  # settings: threshold, confidence, budgets
+        # slices merge per opponent hand stats: only the balanced and ucb rollouts have them
+        assert self.bot.sampling in ("balanced", "ucb"), \
+            "The service runs balanced or ucb rollouts only, not %r sampling" % self.bot.sampling
+        # the tables, the exact slices and the rollout slices all assume every opponent hand is equally likely
+        assert self.bot.opponent_range is None, "The service doesn't support opponent ranges (use bot.decide)"
+        self.workers = workers
+        self.slice_simulations = slice_simulations  # max rollouts per slice
+        self.slice_time = slice_time  # max seconds per slice, so an urgent request never waits long for a worker
+        self.margin = 0.005  # requests are answered this many seconds before their deadline, slices stop 2x before
+        self.prior_simulations = 100  # rollouts run in place when the deadline hits before any slice finished
+        self.seed_stream = random.Random(seed)  # one seed per slice
+        self.pool = None
+        self.ready = []  # earliest deadline first heap of (deadline, sequence, job)
+        self.sequence = count()
+        self.idle = workers  # workers without a slice
+        self.finished = Counter()  # answered requests by reason: table, exact, settled, budget, deadline
+
+    def open(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self.bot,))
+        list(self.pool.map(warm_up, [0.05] * self.workers))  # start every worker before the first deadline counts
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def stats(self):
+        return {"answered": sum(self.finished.values()), "waiting": len(self.ready), "idle_workers": self.idle,
+                **self.finished}
+
+    async def decide(self, my_hand, revealed_cards, num_opponents=1, deadline=None, max_simulations=None):
+        """DecisionReport of the best estimate available by the deadline (seconds from now, default the bot's
+        simulation_time_limit) or once the decision is settled/ max_simulations (default the bot's) are used up"""
+
+        check_opponents(my_hand, revealed_cards, num_opponents)  # the rollouts could never deal more
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = self.bot.simulation_time_limit if self.bot.simulation_time_limit is not None else math.inf
+        if max_simulations is None:
+            max_simulations = self.bot.simulation_limit if self.bot.simulation_limit is not None else math.inf
+        job = DecisionJob(my_hand, revealed_cards, num_opponents, time.time() + deadline, max_simulations,
+                          loop.create_future())
+
+        heads_up = num_opponents == 1
+        if heads_up and self.bot.precomputed_report(job.report, my_hand, revealed_cards):
+            self._finish(job, "table")
+            return job.future.result()
+
+        job.exact = heads_up and self.bot.count_evaluations(my_hand, revealed_cards) <= self.bot.enumeration_budget
+        if deadline != math.inf:
+            job.timer = loop.call_later(max(0, deadline - self.margin), self._finish, job, "deadline")
+        self._queue(job)
+        self._dispatch()
+        return await job.future
+
+    def _queue(self, job):
+        job.queued = True
+        heappush(self.ready, (job.deadline, next(self.sequence), job))
+
+    def _dispatch(self):
+        """hands slices of the most urgent requests to the idle workers"""
+        loop = asyncio.get_running_loop()
+        while self.idle > 0 and self.ready:
+            _, _, job = heappop(self.ready)
+            job.queued = False
+            if job.future.done() or time.time() >= job.deadline - 2 * self.margin:
+                continue  # answered or about to be answered by its timer
+
+            simulations = 0
+            if job.exact:
+                task = loop.run_in_executor(self.pool, exact_slice, job.my_hand, job.revealed_cards)
+            else:
+                simulations = min(self.slice_simulations, job.budget - job.scheduled)
+                task = loop.run_in_executor(self.pool, rollout_slice, job.my_hand, job.revealed_cards,
+                                            job.num_opponents,
+                                            min(job.deadline - 2 * self.margin, time.time() + self.slice_time),
+                                            self.seed_stream.getrandbits(64), simulations)
+                job.scheduled += simulations
+                if job.scheduled < job.budget:
+                    self._queue(job)  # still the most urgent: the next idle worker takes another slice of it
+            self.idle -= 1
+            task.add_done_callback(partial(self._slice_done, job, simulations))
+
+    def _fail(self, job, error):
+        """answers a request with an error"""
+        if job.future.done():
+            return
+        if job.timer is not None:
+            job.timer.cancel()
+        self.finished["error"] += 1
+        job.future.set_exception(error)
+
+    def _slice_done(self, job, scheduled, task):
+        self.idle += 1
+        if task.cancelled():
+            return
+        try:
+            self._merge_slice(job, scheduled, task)
+        except Exception as error:  # a callback's exception would only be logged, the request never answered
+            self._fail(job, error)
+        self._dispatch()
+
+    def _merge_slice(self, job, scheduled, task):
+        """adds a finished slice to its request, answers it when it is done"""
+        if task.exception() is not None:
+            self._fail(job, task.exception())
+        elif not job.future.done():
+            if job.exact:
+                job.report.method = "exact"
+                job.report.win_rate, job.report.simulations = task.result()
+                job.report.interval = (job.report.win_rate, job.report.win_rate)
+                job.report.opponent_hands = math.comb(52 - len(job.my_hand) - len(job.revealed_cards), 2)
+                self._finish(job, "exact")
+            else:
+                wins, visits, simulations = task.result()
+                for combo_number in range(len(COMBOS)):
+                    job.wins[combo_number] += wins[combo_number]
+                    job.visits[combo_number] += visits[combo_number]
+                job.simulations += simulations
+                job.scheduled -= scheduled - simulations  # a slice cut short by its time limit gives back the rest
+                if job.simulations >= job.budget:
+                    self._finish(job, "budget")
+                elif self._settled(job):
+                    self._finish(job, "settled")
+                elif not job.queued and job.scheduled < job.budget:
+                    self._queue(job)
+
+    def _settled(self, job):
+        """the confidence interval around the merged win rate no longer contains the stay/ fold threshold"""
+        z = self.bot.stopping_z()
+        if z is None or job.simulations < self.bot.min_simulations:
+            return False
+        win_rate, _ = combo_win_rate(job.wins, job.visits)
+        lower, upper = wilson_interval(win_rate * job.simulations, job.simulations, z)
+        threshold = self.bot.win_threshold(job.num_opponents)
+        return lower >= threshold or upper < threshold
+
+    def _finish(self, job, reason):
+        """answers a request with its current estimate (or an error when that fails)"""
+        try:
+            self._answer(job, reason)
+        except Exception as error:  # called by the deadline timer too, where an exception would be lost
+            self._fail(job, error)
+
+    def _answer(self, job, reason):
+        if job.future.done():
+            return
+        if job.timer is not None:
+            job.timer.cancel()
+
+        report = job.report
+        if report.method is None:
+            if job.simulations == 0:  # deadline hit before any slice finished: a few rollouts in place
+                # bounded by both a rollout count and the margin, as they block the event loop
+                report.method = "prior"
+                wins, visits, simulations, _ = self.bot.run_rollouts(
+                    job.my_hand, job.revealed_cards, time.time() + self.margin,
+                    random.Random(self.seed_stream.getrandbits(64)), self.prior_simulations, False, job.num_opponents)
+            else:
+                report.method = "mcts"
+                wins, visits, simulations = job.wins, job.visits, job.simulations
+            report.win_rate, report.opponent_hands = combo_win_rate(wins, visits)
+            report.simulations = simulations
+            z = NormalDist().inv_cdf((1 + (self.bot.confidence or 0.95)) / 2)
+            report.interval = wilson_interval(report.win_rate * simulations, simulations, z)
+        report.decision = "stay" if report.win_rate >= self.bot.win_threshold(job.num_opponents) else "fold"
+        report.elapsed = time.perf_counter() - job.start
+        if self.bot.telemetry is not None:
+            self.bot.telemetry(report)
+        self.finished[reason] += 1
+        job.future.set_result(report)
+
+    async def answer(self, line):
+        """JSON response line to a JSON request line"""
+        response = {}
+        try:
+            request = json.loads(line)
+            response["id"] = request.get("id")
+            my_hand, revealed_cards, num_opponents = parse_scenario(request)
+            deadline_ms = request.get("deadline_ms")
+            report = await self.decide(my_hand, revealed_cards, num_opponents,
+                                       deadline_ms / 1000 if deadline_ms is not None else None,
+                                       request.get("simulations"))
+            response.update(equity=report.win_rate, decision=report.decision, method=report.method,
+                            simulations=report.simulations, interval=list(report.interval),
+                            elapsed_ms=round(report.elapsed * 1000, 3))
+        except Exception as error:  # every request gets a response
+            response["error"] = "%s: %s" % (type(error).__name__, error)
+        return json.dumps(response)
+
+    async def handle_connection(self, reader, writer):
+        """serves one client: requests on the connection are worked on concurrently"""
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line):
+            response = await self.answer(line)
+            async with write_lock:
+                writer.write(response.encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(respond(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:  # server shutting down: drop the requests still being worked on
+            for task in tasks:
+                task.cancel()
+        finally:
+            writer.close()
+
+    async def start_server(self, host="127.0.0.1", port=4800, path=None):
+        """listens on a unix socket at path, or on host:port (port 0 picks a free one)"""
+        if self.pool is None:
+            self.open()
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+def percentile(ordered, q):
+    """nearest rank percentile of a sorted list"""
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+async def generate_load(host="127.0.0.1", port=4800, path=None, requests=1000, concurrency=32, deadline_ms=100,
+                        opponents=1, seed=None):
+    """closed loop load: `concurrency` clients each send one random decision request at a time
+    returns throughput (requests/s) and latency percentiles (ms) measured by the clients"""
+
+    rng = random.Random(seed)
+    scenarios = []
+    for request_id in range(requests):
+        my_hand, community_cards, _ = random_setup(rng)
+        scenarios.append(json.dumps({"id": request_id, "hole": my_hand, "board": community_cards[:rng.choice((0, 3, 4, 5))],
+                                     "opponents": opponents, "deadline_ms": deadline_ms}).encode() + b"\n")
+    pending = iter(scenarios)
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for scenario in pending:  # shared by every client
+                sent = time.perf_counter()
+                writer.write(scenario)
+                await writer.drain()
+                response = json.loads(await reader.readline())
+                latencies.append((time.perf_counter() - sent) * 1000)
+                errors += "error" in response
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(concurrency, requests))))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    return {"requests": len(latencies), "errors": errors, "seconds": seconds,
+            "throughput": len(latencies) / seconds if seconds > 0 else 0,
+            "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99), "max_ms": latencies[-1] if latencies else 0,
+            "late": sum(latency > deadline_ms for latency in latencies)}
+
+
+async def serve(args):
+    bot = PokerBot()
+    service = DecisionService(bot, args.workers, args.slice, args.slice_ms / 1000, args.seed)
+    server = await service.start_server(args.host, args.port, args.unix)
+    print("serving on %s with %d workers" % (args.unix or "%s:%d" % server.sockets[0].getsockname()[:2], args.workers))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="local poker decision service and its load generator")
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4800)
+    parser.add_argument("--unix", default=None, help="unix socket path (instead of host:port)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="serve: rollout processes")
+    parser.add_argument("--slice", type=int, default=2000, help="serve: rollouts per scheduled slice")
+    parser.add_argument("--slice-ms", type=float, default=10, help="serve: max milliseconds per scheduled slice")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--requests", type=int, default=1000, help="load: number of requests")
+    parser.add_argument("--concurrency", type=int, default=32, help="load: concurrent clients")
+    parser.add_argument("--deadline-ms", type=float, default=100, help="load: deadline of every request")
+    parser.add_argument("--opponents", type=int, default=1, help="load: opponents of every request")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    results = asyncio.run(generate_load(args.host, args.port, args.unix, args.requests, args.concurrency,
+                                        args.deadline_ms, args.opponents, args.seed))
+    print("%d requests (%d errors) in %.2fs: %.1f requests/s" % (results["requests"], results["errors"],
+                                                                  results["seconds"], results["throughput"]))
+    print("latency p50 %.1fms p95 %.1fms p99 %.1fms max %.1fms, %d over the %.0fms deadline" % (
+        results["p50_ms"], results["p95_ms"], results["p99_ms"], results["max_ms"], results["late"], args.deadline_ms))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
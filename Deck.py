@@ -1,4 +1,5 @@
 import random
+from itertools import combinations
 
 
 # constants
@@ -20,32 +21,141 @@ def show_hand(hand):
     return [show_card(card) for card in hand]
 
 
+def parse_card(card):
+    """inverse of show_card: "A♠" or "As" (suits c/d/h/s) to its integer card (0-51), integers pass through"""
+    if isinstance(card, int):
+        if not 0 <= card < NUM_CARDS:
+            raise ValueError("Card out of range: %r" % card)
+        return card
+    ranks = "23456789TJQKA"
+    suits = {"♣": 0, "♦": 1, "♥": 2, "♠": 3, "c": 0, "d": 1, "h": 2, "s": 3}
+    if len(card) != 2 or card[0].upper() not in ranks or card[1].lower() not in suits:
+        raise ValueError("Unknown card: %r" % card)
+    return 13 * suits[card[1].lower()] + ranks.index(card[0].upper())
+
+
+def parse_hand(cards):
+    """takes a list of cards (strings or integers) and converts them into integer cards"""
+    return [parse_card(card) for card in cards]
+
+
+# card set representation
+class CardSet:
+    """set of cards stored as a 52 bit mask (bit n set = card n in the set)"""
+
+    __slots__ = ("mask",)
+
+    def __init__(self, cards=(), mask=0):
+        for card in cards:
+            mask |= 1 << card
+        self.mask = mask
+
+    def __contains__(self, card):
+        return self.mask >> card & 1 == 1
+
+    def __len__(self):
+        return bin(self.mask).count("1")
+
+    def __iter__(self):
+        """yields the cards in increasing order"""
+        mask = self.mask
+        while mask:
+            lowest = mask & -mask
+            yield lowest.bit_length() - 1
+            mask ^= lowest
+
+    def __eq__(self, other):
+        return isinstance(other, CardSet) and self.mask == other.mask
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __or__(self, other):
+        return CardSet(mask=self.mask | other.mask)
+
+    def __repr__(self):
+        return "CardSet(%s)" % show_hand(list(self))
+
+    def add(self, card):
+        self.mask |= 1 << card
+
+    def update(self, cards):
+        for card in cards:
+            self.mask |= 1 << card
+
+    def isdisjoint(self, other):
+        return self.mask & other.mask == 0
+
+    def complement(self):
+        """every card not in this set"""
+        return CardSet(mask=FULL_MASK ^ self.mask)
+
+
+FULL_MASK = (1 << NUM_CARDS) - 1
+
+
+# every possible pair of hole cards (1326 combos), indexed by combo number
+COMBOS = list(combinations(range(52), 2))
+COMBO_SETS = [CardSet(combo) for combo in COMBOS]
+
+
+def combo_number(card_a, card_b):
+    """index of a pair of hole cards in COMBOS"""
+    if card_a > card_b:
+        card_a, card_b = card_b, card_a
+    return card_a * 51 - card_a * (card_a - 1) // 2 + card_b - card_a - 1
+
+
 # deck representation
 class Deck:
-    def __init__(self):
-        """initializes and shuffles a 52 card deck using integers to represent cards (0-51)"""
-        self.cards = list(range(NUM_CARDS))
-        random.shuffle(self.cards)
+    def __init__(self, rng=None):
+        """initializes and shuffles a 52 card deck using integers to represent cards (0-51)
+        rng: random.Random instance to shuffle and sample with (defaults to the random module)"""
+        self.rng = rng if rng is not None else random
+        self.cards = list(range(NUM_CARDS))  # remaining cards, also the buffer sample shuffles in place
+        self.removed = CardSet()  # drawn and removed cards
+        self.rng.shuffle(self.cards)
 
     def draw(self, n = 1):
         """draws n cards from the top of the deck.
         returns a list of n cards (represented as integers)"""
         drawn = self.cards[:n]  # drawn cards to return
         self.cards = self.cards[n:]  # remaining cards in deck
+        self.removed.update(drawn)
         return drawn
 
     def remove_cards(self, cards_to_remove):
         """removes a list of known cards from deck:
         known hole cards or community cards"""
-        to_remove = set(cards_to_remove) # for faster lookup
-        self.cards = [card for card in self.cards if card not in to_remove]
+        self.removed.update(cards_to_remove)
+        self.cards = [card for card in self.cards if card not in self.removed]
 
     def copy(self):
         """creates a copy of the deck for simulated rollouts"""
-        temp = Deck()
+        temp = Deck(self.rng)
         temp.cards = self.cards[:]
+        temp.removed = CardSet(mask=self.removed.mask)
         return temp
 
-    def sample(self, n):
-        """randomly sample n cards from current deck (simulate unknown opponent's hand or unrevealed community cards)"""
-        return random.sample(self.cards, n)
\ No newline at end of file
+    def sample(self, n, exclude=None):
+        """randomly sample n cards from current deck (simulate unknown opponent's hand or unrevealed community cards)
+        partial fisher-yates shuffle of the first n positions of the card buffer: O(n), no new deck per rollout
+        exclude: CardSet of cards to skip (e.g. a sampled opponent hand) without removing them from the deck"""
+        cards = self.cards
+        size = len(cards)
+        exclude_mask = exclude.mask if exclude is not None else 0
+        # excluded cards still in the deck can't be drawn (the deck holds every card not removed)
+        excluded = bin(exclude_mask & ~self.removed.mask & FULL_MASK).count("1") if exclude_mask else 0
+        if n > size - excluded:
+            raise ValueError("Sample larger than the deck")
+        random_float = self.rng.random
+        i = 0
+        while i < n:
+            j = i + int(random_float() * (size - i))
+            card = cards[j]
+            if exclude_mask >> card & 1:  # rejected: draw another position for slot i
+                continue
+            cards[j] = cards[i]
+            cards[i] = card
+            i += 1
+        return cards[:n]
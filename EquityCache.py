@@ -0,0 +1,99 @@
+import sqlite3
+from collections import OrderedDict
+from Evaluator import rank, suit
+
+
+# suit isomorphism: relabelling suits never changes a decision (A♠ K♠ on Q♠ J♠ 2♥ ~ A♥ K♥ on Q♥ J♥ 2♦)
+# every suit is described by (rank bitmask of our hole cards, rank bitmask of the board) in that suit,
+# sorting the 4 descriptions gives the same order for every relabelling and suits with equal descriptions
+# hold the same cards, so the sorted descriptions are a canonical form of (hole, board)
+def suit_signatures(hole, board):
+    """sorted (hole rank mask, board rank mask) of every suit, strongest first"""
+    hole_masks = [0, 0, 0, 0]
+    board_masks = [0, 0, 0, 0]
+    for card in hole:
+        hole_masks[suit(card)] |= 1 << rank(card)
+    for card in board:
+        board_masks[suit(card)] |= 1 << rank(card)
+    return sorted(zip(hole_masks, board_masks), reverse=True)
+
+
+def canonical_hand(hole, board):
+    """relabels suits so every suit-isomorphic (hole, board) maps to the same sorted (hole, board) cards"""
+    canonical_hole, canonical_board = [], []
+    for new_suit, (hole_mask, board_mask) in enumerate(suit_signatures(hole, board)):
+        canonical_hole += [13 * new_suit + card_rank for card_rank in range(13) if hole_mask >> card_rank & 1]
+        canonical_board += [13 * new_suit + card_rank for card_rank in range(13) if board_mask >> card_rank & 1]
+    return sorted(canonical_hole), sorted(canonical_board)
+
+
+def canonical_key(hole, board, num_opponents=1):
+    """compact cache key of a decision: canonical suit masks packed into hex, plus the number of opponents"""
+    packed = 0
+    for hole_mask, board_mask in suit_signatures(hole, board):
+        packed = (packed << 26) | (hole_mask << 13) | board_mask
+    return "%026x:%d" % (packed, num_opponents)
+
+
+class EquityCache:
+    """bounded in memory LRU of decision results backed by an optional sqlite file
+    values are (win rate, method, simulations) tuples"""
+
+    def __init__(self, path=None, capacity=100000):
+        self.capacity = capacity
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS equity "
+                                    "(key TEXT PRIMARY KEY, win_rate REAL, method TEXT, simulations INTEGER)")
+            self.connection.commit()
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)  # least recently used
+
+    def get(self, key):
+        """cached (win rate, method, simulations) or None"""
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return value
+
+        if self.connection is not None:
+            row = self.connection.execute("SELECT win_rate, method, simulations FROM equity WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+                self._remember(key, row)
+                return row
+
+        self.misses += 1
+        return None
+
+    def put(self, key, win_rate, method, simulations):
+        value = (win_rate, method, simulations)
+        self._remember(key, value)
+        if self.connection is not None:
+            self.connection.execute("INSERT OR REPLACE INTO equity VALUES (?, ?, ?, ?)", (key,) + value)
+            self.connection.commit()
+
+    def hit_rate(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups > 0 else 0
+
+    def stats(self):
+        return {"memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "hit_rate": self.hit_rate(), "entries": len(self.memory)}
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -1,4 +1,13 @@
+import os
+import mmap
+from array import array
 from collections import Counter
+from itertools import combinations_with_replacement
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for batch evaluation
+    np = None
 
 
 # hand ranking numeric breakdown
@@ -24,8 +33,8 @@ def suit(card):
     return card // 13
 
 
-# evaluation function
-def evaluate_hand(hand):
+# reference evaluation function (used to generate the lookup tables)
+def classify_hand(hand):
     """evaluate a 7 card hand and return its rank
     returns a tuple representing
     (hand rank as an integer, tiebreaker cards)"""
@@ -125,9 +134,233 @@ def evaluate_hand(hand):
     return 0, sorted(ranks, reverse=True)[:5]
 
 
+# lookup table evaluator
+# every card maps to a key: (rank key << 12) | (1 << 3 * suit)
+# - rank keys are chosen so the sum over any 7 cards is unique for every rank multiset (max sum 7825759)
+# - the low 12 bits hold a 3 bit counter per suit, so the sum also tells us if (and which) suit made a flush
+# the rank key sum indexes a table of non-flush hand strengths and the suited rank bitmask indexes a table of
+# flush hand strengths. a hand strength is a single integer (0-7461) where bigger always means a better hand
+RANK_KEYS = [0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181]
+SUIT_SHIFT = 12
+SUIT_MASK = (1 << SUIT_SHIFT) - 1
+RANK_TABLE_SIZE = 4 * RANK_KEYS[12] + 3 * RANK_KEYS[11] + 1  # four aces and three kings give the largest sum
+FLUSH_TABLE_SIZE = 1 << 13
+
+CARD_KEYS = [(RANK_KEYS[rank(card)] << SUIT_SHIFT) | (1 << 3 * suit(card)) for card in range(52)]
+CARD_BITS = [1 << rank(card) for card in range(52)]
+CARD_SUITS = [suit(card) for card in range(52)]
+
+# maps the packed suit counters of a 7 card key to the flush suit (-1 if there is no flush)
+FLUSH_SUIT = [next((card_suit for card_suit in range(4) if (suit_counts >> 3 * card_suit) & 7 >= 5), -1)
+              for suit_counts in range(SUIT_MASK + 1)]
+
+# tiebreaker cards kept by each hand rank
+TIEBREAKER_COUNT = {9: 5, 8: 5, 7: 2, 6: 2, 5: 5, 4: 5, 3: 3, 2: 3, 1: 4, 0: 5}
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hand_ranks.bin")
+TABLE_MAGIC = b"PKHR"
+TABLE_VERSION = 1
+
+
+def pack_class(hand_class):
+    """packs (hand rank, tiebreaker cards) into one integer: 4 bits per tiebreaker under the hand rank"""
+    hand_rank, tiebreakers = hand_class
+    packed = hand_rank
+    for card_rank in tiebreakers:
+        packed = (packed << 4) | card_rank
+    return packed << 4 * (5 - len(tiebreakers))
+
+
+def unpack_class(packed):
+    """inverse of pack_class"""
+    hand_rank = packed >> 20
+    tiebreakers = [(packed >> 16 - 4 * i) & 15 for i in range(TIEBREAKER_COUNT[hand_rank])]
+    return hand_rank, tiebreakers
+
+
+def build_tables():
+    """enumerates every rank multiset and every suited rank bitmask with the reference evaluator
+    returns (packed hand classes sorted weakest to strongest, flush table, rank table)"""
+
+    # non-flush hands: spread the suits so no suit repeats more than twice
+    rank_hands = {}
+    for ranks in combinations_with_replacement(range(13), 7):
+        if any(ranks.count(card_rank) > 4 for card_rank in set(ranks)):
+            continue
+        hand = [13 * (i % 4) + card_rank for i, card_rank in enumerate(ranks)]
+        rank_hands[sum(RANK_KEYS[card_rank] for card_rank in ranks)] = classify_hand(hand)
+
+    # flush hands: 5-7 suited cards decide the hand on their own, pad with off suit cards
+    flush_hands = {}
+    for mask in range(FLUSH_TABLE_SIZE):
+        suited = [card_rank for card_rank in range(13) if mask >> card_rank & 1]
+        if not 5 <= len(suited) <= 7:
+            continue
+        padding = [13 + card_rank for card_rank in range(7 - len(suited))]
+        flush_hands[mask] = classify_hand(suited + padding)
+
+    # dense strengths: position of each distinct hand class in sorted order
+    classes = sorted({pack_class(hand_class) for hand_class in list(rank_hands.values()) + list(flush_hands.values())})
+    strength_of = {packed: strength for strength, packed in enumerate(classes)}
+
+    flush_table = array("H", bytes(2 * FLUSH_TABLE_SIZE))
+    for mask, hand_class in flush_hands.items():
+        flush_table[mask] = strength_of[pack_class(hand_class)]
+    rank_table = array("H", bytes(2 * RANK_TABLE_SIZE))
+    for key, hand_class in rank_hands.items():
+        rank_table[key] = strength_of[pack_class(hand_class)]
+
+    return array("I", classes), flush_table, rank_table
+
+
+def write_tables(path, classes, flush_table, rank_table):
+    """persists the tables: header (magic, version, number of classes), classes, flush table, rank table"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(TABLE_MAGIC)
+        f.write(array("H", [TABLE_VERSION, len(classes)]).tobytes())
+        f.write(classes.tobytes())
+        f.write(flush_table.tobytes())
+        f.write(rank_table.tobytes())
+    os.replace(tmp_path, path)  # never leave a half written table behind
+
+
+def map_tables(path):
+    """memory maps a table file written by write_tables
+    returns (classes, flush table, rank table) as read only views or None if the file is missing or stale"""
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    view = memoryview(mapped)
+    if len(view) < 8 or view[:4] != TABLE_MAGIC:
+        return None
+    version, num_classes = view[4:8].cast("H")
+    classes_end = 8 + 4 * num_classes
+    flush_end = classes_end + 2 * FLUSH_TABLE_SIZE
+    if version != TABLE_VERSION or len(view) != flush_end + 2 * RANK_TABLE_SIZE:
+        return None
+    return view[8:classes_end].cast("I"), view[classes_end:flush_end].cast("H"), view[flush_end:].cast("H")
+
+
+def load_tables(path=TABLE_PATH):
+    """memory maps the lookup tables, generating and persisting them first if needed"""
+    tables = map_tables(path)
+    if tables is not None:
+        return tables
+
+    tables = build_tables()
+    try:
+        write_tables(path, *tables)
+    except OSError:  # read only location: keep the freshly built tables in memory
+        return tables
+    return map_tables(path) or tables
+
+
+CLASSES, FLUSH_TABLE, RANK_TABLE = load_tables()
+DECODED_CLASSES = [unpack_class(packed) for packed in CLASSES]
+
+
+def hand_strength(hand):
+    """evaluate a 7 card hand to a single integer, bigger is always better and equal means a tie"""
+    key = sum(map(CARD_KEYS.__getitem__, hand))
+    flush_suit = FLUSH_SUIT[key & SUIT_MASK]
+    if flush_suit < 0:
+        return RANK_TABLE[key >> SUIT_SHIFT]
 
+    # flush: only the ranks of the flush suit matter
+    mask = 0
+    for card in hand:
+        if CARD_SUITS[card] == flush_suit:
+            mask |= CARD_BITS[card]
+    return FLUSH_TABLE[mask]
 
 
+class PartialHand:
+    """rank key sum, suit counters and per suit rank bitmasks of the known cards of a hand
+    built once per decision and completed with just the sampled cards in every rollout"""
 
+    __slots__ = ("key", "suit_masks")
 
+    def __init__(self, cards=()):
+        self.key = 0
+        self.suit_masks = [0, 0, 0, 0]
+        for card in cards:
+            self.key += CARD_KEYS[card]
+            self.suit_masks[CARD_SUITS[card]] |= CARD_BITS[card]
 
+    def extend(self, cards):
+        """new partial hand with more known cards (e.g. the board plus an opponent's hole cards)"""
+        extended = PartialHand()
+        extended.key = self.key + sum(map(CARD_KEYS.__getitem__, cards))
+        extended.suit_masks = self.suit_masks[:]
+        for card in cards:
+            extended.suit_masks[CARD_SUITS[card]] |= CARD_BITS[card]
+        return extended
+
+    def strength(self, cards=()):
+        """hand strength of the known cards plus `cards` (7 cards in total), same value as hand_strength"""
+        key = self.key + sum(map(CARD_KEYS.__getitem__, cards))
+        flush_suit = FLUSH_SUIT[key & SUIT_MASK]
+        if flush_suit < 0:
+            return RANK_TABLE[key >> SUIT_SHIFT]
+
+        # flush: add the new cards of the flush suit to the known ones
+        mask = self.suit_masks[flush_suit]
+        for card in cards:
+            if CARD_SUITS[card] == flush_suit:
+                mask |= CARD_BITS[card]
+        return FLUSH_TABLE[mask]
+
+
+def decode_strength(strength):
+    """converts a hand strength back to (hand rank as an integer, tiebreaker cards)"""
+    hand_rank, tiebreakers = DECODED_CLASSES[strength]
+    return hand_rank, list(tiebreakers)
+
+
+# evaluation function
+def evaluate_hand(hand):
+    """evaluate a 7 card hand and return its rank
+    returns a tuple representing
+    (hand rank as an integer, tiebreaker cards)"""
+
+    assert len(hand) == 7, "Must provide exactly 7 cards (2 hole cards, 5 community cards)"
+    return decode_strength(hand_strength(hand))
+
+
+# batch evaluation (numpy)
+if np is not None:
+    CARD_KEYS_ARRAY = np.array(CARD_KEYS, dtype=np.int64)
+    CARD_BITS_ARRAY = np.array(CARD_BITS, dtype=np.int64)
+    CARD_SUITS_ARRAY = np.array(CARD_SUITS, dtype=np.int64)
+    FLUSH_SUIT_ARRAY = np.array(FLUSH_SUIT, dtype=np.int64)
+    FLUSH_TABLE_ARRAY = np.frombuffer(FLUSH_TABLE, dtype=np.uint16)
+    RANK_TABLE_ARRAY = np.frombuffer(RANK_TABLE, dtype=np.uint16)
+
+
+def evaluate_hands_batch(cards):
+    """evaluate an (N, 7) array of cards to an (N,) array of hand strengths (same values as hand_strength)
+    the summed card keys are the rank and suit histograms of every hand: the suit counters flag flushes
+    for the whole batch and the rank key sums resolve pairs, straights, etc. through the rank table"""
+
+    if np is None:
+        raise ImportError("evaluate_hands_batch requires numpy")
+
+    cards = np.asarray(cards, dtype=np.intp)
+    assert cards.ndim == 2 and cards.shape[1] == 7, "Must provide an (N, 7) array of cards"
+
+    keys = CARD_KEYS_ARRAY[cards].sum(axis=1)
+    strengths = RANK_TABLE_ARRAY[keys >> SUIT_SHIFT].astype(np.int32)
+
+    # flushes: or together the rank bits of the cards in the flush suit
+    flush_suits = FLUSH_SUIT_ARRAY[keys & SUIT_MASK]
+    flushed = np.flatnonzero(flush_suits >= 0)
+    if flushed.size:
+        flush_cards = cards[flushed]
+        suited = CARD_SUITS_ARRAY[flush_cards] == flush_suits[flushed, None]
+        masks = np.bitwise_or.reduce(np.where(suited, CARD_BITS_ARRAY[flush_cards], 0), axis=1)
+        strengths[flushed] = FLUSH_TABLE_ARRAY[masks]
+    return strengths
@@ -0,0 +1,283 @@
+import os
+import sys
+import mmap
+import time
+import random
+import shutil
+import argparse
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+from Deck import parse_hand
+from Evaluator import DECODED_CLASSES, PartialHand, evaluate_hands_batch, np
+from EquityCache import canonical_hand
+from PreflopTable import NUM_CLASSES, class_hole_cards, class_name
+
+
+# every (hole cards, flop) up to suit relabelling: 1,286,792 spots (of 1326 * 19600 deals)
+# a spot's key packs its canonical cards (EquityCache.canonical_hand) into 30 bits: hole, hole, flop, flop, flop
+# index file: header (magic, version, spots, samples per spot), then three arrays over the spots in key order
+# - keys (uint32, sorted: lookups binary search the mapped array)
+# - equity against a random hand (float32, monte carlo over turn, river and opponent hand)
+# - histogram of our final hand rank over every turn and river (uint16 x 10, high card ... royal flush)
+# the file is memory mapped read only, so every process shares the same pages
+HAND_RANKS = 10
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flop_index.bin")
+INDEX_MAGIC = b"PKFX"
+INDEX_VERSION = 1
+HEADER_SIZE = 16
+
+STRENGTH_RANKS = [hand_rank for hand_rank, _ in DECODED_CLASSES]  # hand strength -> hand rank (0-9)
+if np is not None:
+    STRENGTH_RANKS_ARRAY = np.array(STRENGTH_RANKS, dtype=np.intp)
+
+
+def spot_key(hole, flop):
+    """index key of a hole cards + flop spot, the same for every suit relabelling"""
+    canonical_hole, canonical_flop = canonical_hand(hole, flop)
+    key = 0
+    for card in canonical_hole + canonical_flop:
+        key = key << 6 | card
+    return key
+
+
+def key_cards(key):
+    """(hole cards, flop) of a key, with the canonical suits"""
+    cards = [key >> shift & 63 for shift in (24, 18, 12, 6, 0)]
+    return cards[:2], cards[2:]
+
+
+def canonical_spots(hand_classes=range(NUM_CLASSES)):
+    """sorted keys of every canonical spot whose hole cards are in one of the starting hand classes
+    (every spot of a class is reached from its representative hole cards, other suits are relabellings)"""
+    keys = set()
+    for hand_class in hand_classes:
+        hole = class_hole_cards(hand_class)
+        remaining = [card for card in range(52) if card not in hole]
+        for flop in combinations(remaining, 3):
+            keys.add(spot_key(hole, flop))
+    return sorted(keys)
+
+
+def spot_stats(hole, flop, samples, rng):
+    """(monte carlo equity against a random hand with `samples` rollouts, hand rank histogram over every runout)
+    rng: random.Random instance (also seeds numpy when batch evaluation is available)"""
+    known = hole + flop
+    remaining = [card for card in range(52) if card not in known]
+    histogram = [0] * HAND_RANKS
+
+    if np is None:
+        my_partial = PartialHand(known)
+        for runout in combinations(remaining, 2):
+            histogram[STRENGTH_RANKS[my_partial.strength(runout)]] += 1
+        board_partial = PartialHand(flop)
+        wins = 0
+        for _ in range(samples):
+            dealt = rng.sample(remaining, 4)  # turn, river, opponent hand
+            my_strength, opponent_strength = my_partial.strength(dealt[:2]), board_partial.strength(dealt)
+            wins += 1 if my_strength > opponent_strength else 0.5 if my_strength == opponent_strength else 0
+        return wins / samples, histogram
+
+    remaining = np.array(remaining)
+    runouts = np.array(list(combinations(remaining.tolist(), 2)))
+    my_cards = np.hstack([np.broadcast_to(known, (len(runouts), 5)), runouts])
+    histogram = np.bincount(STRENGTH_RANKS_ARRAY[evaluate_hands_batch(my_cards)], minlength=HAND_RANKS).tolist()
+
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    dealt = remaining[np.argpartition(np_rng.random((samples, len(remaining))), 4, axis=1)[:, :4]]
+    board = np.hstack([np.broadcast_to(flop, (samples, 3)), dealt[:, :2]])
+    my_strength = evaluate_hands_batch(np.hstack([np.broadcast_to(hole, (samples, 2)), board]))
+    opponent_strength = evaluate_hands_batch(np.hstack([dealt[:, 2:], board]))
+    wins = np.count_nonzero(my_strength > opponent_strength) + 0.5 * np.count_nonzero(my_strength == opponent_strength)
+    return wins / samples, histogram
+
+
+def part_path(parts_directory, chunk_number):
+    return os.path.join(parts_directory, "part_%06d.bin" % chunk_number)
+
+
+def read_part(path, keys, samples):
+    """(equities, histograms) of a finished chunk, None if it is missing or was built for other keys/ samples"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    count = len(keys)
+    if len(data) != 12 + count * (4 + 2 * HAND_RANKS) or list(array("I", data[:12])) != [keys[0], count, samples]:
+        return None
+    return array("f", data[12:12 + 4 * count]), array("H", data[12 + 4 * count:])
+
+
+def build_part(path, keys, samples, seed):
+    """computes one chunk of spots and writes it atomically (a killed build never leaves a half written part)"""
+    rng = random.Random(seed)
+    equities, histograms = array("f"), array("H")
+    for key in keys:
+        equity, histogram = spot_stats(*key_cards(key), samples, rng)
+        equities.append(equity)
+        histograms.extend(histogram)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(array("I", [keys[0], len(keys), samples]).tobytes())
+        f.write(equities.tobytes())
+        f.write(histograms.tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_index(path, keys, samples=2000, workers=1, seed=None, chunk=2000, log=None):
+    """computes every spot of `keys` (sorted) in chunks over `workers` processes and writes the index to path
+    finished chunks are kept in path + ".parts", so an interrupted build resumes where it stopped
+    (give the same keys, samples and seed: every chunk has its own seed derived from the master seed)"""
+    parts_directory = path + ".parts"
+    os.makedirs(parts_directory, exist_ok=True)
+    seed_stream = random.Random(seed)
+    chunks = [(keys[start:start + chunk], seed_stream.getrandbits(64)) for start in range(0, len(keys), chunk)]
+    todo = [(chunk_number, chunk_keys, chunk_seed) for chunk_number, (chunk_keys, chunk_seed) in enumerate(chunks)
+            if read_part(part_path(parts_directory, chunk_number), chunk_keys, samples) is None]
+    if log is not None:
+        log("%d spots, %d of %d chunks left" % (len(keys), len(todo), len(chunks)))
+
+    start = time.time()
+    spots_done = 0
+    if workers <= 1:
+        for done, (chunk_number, chunk_keys, chunk_seed) in enumerate(todo, 1):
+            build_part(part_path(parts_directory, chunk_number), chunk_keys, samples, chunk_seed)
+            spots_done += len(chunk_keys)
+            if log is not None:
+                log("chunk %d/%d done, %.0f spots/s" % (done, len(todo), spots_done / (time.time() - start)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(build_part, part_path(parts_directory, chunk_number), chunk_keys, samples,
+                                   chunk_seed): len(chunk_keys)
+                       for chunk_number, chunk_keys, chunk_seed in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                spots_done += futures[future]
+                if log is not None:
+                    log("chunk %d/%d done, %.0f spots/s" % (done, len(todo), spots_done / (time.time() - start)))
+
+    equities, histograms = array("f"), array("H")
+    for chunk_number, (chunk_keys, _) in enumerate(chunks):
+        part_equities, part_histograms = read_part(part_path(parts_directory, chunk_number), chunk_keys, samples)
+        equities.extend(part_equities)
+        histograms.extend(part_histograms)
+    write_index(path, array("I", keys), equities, histograms, samples)
+    shutil.rmtree(parts_directory)
+
+
+def write_index(path, keys, equities, histograms, samples):
+    """persists the index: header (magic, version, spots, samples), keys, equities, histograms"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(INDEX_MAGIC)
+        f.write(array("I", [INDEX_VERSION, len(keys), samples]).tobytes())
+        f.write(keys.tobytes())
+        f.write(equities.tobytes())
+        f.write(histograms.tobytes())
+    os.replace(tmp_path, path)
+
+
+class FlopIndex:
+    """read only view of a memory mapped index file, lookups binary search the sorted keys in place"""
+
+    def __init__(self, view, samples):
+        spots = (len(view) - HEADER_SIZE) // (8 + 2 * HAND_RANKS)
+        equities_start = HEADER_SIZE + 4 * spots
+        histograms_start = equities_start + 4 * spots
+        self.samples = samples
+        self.keys = view[HEADER_SIZE:equities_start].cast("I")
+        self.equities = view[equities_start:histograms_start].cast("f")
+        self.histograms = view[histograms_start:].cast("H")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, hole, flop):
+        """(equity, samples behind it, hand rank histogram) of a spot, None if the index doesn't hold it"""
+        key = spot_key(hole, flop)
+        position = bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return None
+        return self.equities[position], self.samples, list(self.histograms[HAND_RANKS * position:HAND_RANKS * (position + 1)])
+
+
+def map_index(path=INDEX_PATH):
+    """memory maps an index written by write_index, returns a FlopIndex or None if the file is missing or stale"""
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    view = memoryview(mapped)
+    if len(view) < HEADER_SIZE or view[:4] != INDEX_MAGIC:
+        return None
+    version, spots, samples = view[4:HEADER_SIZE].cast("I")
+    if version != INDEX_VERSION or len(view) != HEADER_SIZE + spots * (8 + 2 * HAND_RANKS):
+        return None
+    return FlopIndex(view, samples)
+
+
+INDEX = map_index()
+
+
+def load_index(path=INDEX_PATH):
+    """maps the index flop_lookup answers from (e.g. one built somewhere else), returns it or None"""
+    global INDEX
+    INDEX = map_index(path)
+    return INDEX
+
+
+def flop_lookup(hole, flop):
+    """(equity, samples behind it, hand rank histogram) of hole cards on a flop from the precomputed index
+    (None without an index or when it doesn't hold the spot)"""
+    if INDEX is None:
+        return None
+    return INDEX.lookup(hole, flop)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="build or query the flop equity index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="precompute every canonical hole cards + flop spot (resumable)")
+    build.add_argument("--samples", type=int, default=2000, help="rollouts per spot")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--seed", type=int, default=480, help="master seed (keep it when resuming)")
+    build.add_argument("--chunk", type=int, default=2000, help="spots per resumable work unit")
+    build.add_argument("--hands", nargs="*", help="only these starting hands, e.g. AA AKs 72o (default: all 169)")
+    build.add_argument("--path", default=INDEX_PATH)
+    query = subparsers.add_parser("query", help="look up one spot")
+    query.add_argument("cards", nargs=5, help="2 hole cards then the flop, e.g. As Ks Qs Js 2h")
+    query.add_argument("--path", default=INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        index = map_index(args.path)
+        if index is None:
+            print("no index at %s" % args.path)
+            return 1
+        cards = parse_hand(args.cards)
+        found = index.lookup(cards[:2], cards[2:])
+        if found is None:
+            print("spot not in the index")
+            return 1
+        print("equity %.4f (%d samples), hand rank histogram %s" % found)
+        return 0
+
+    start = time.time()
+    names = {class_name(hand_class): hand_class for hand_class in range(NUM_CLASSES)}
+    if args.hands:
+        unknown = [name for name in args.hands if name not in names]
+        if unknown:
+            parser.error("unknown starting hands: %s" % " ".join(unknown))
+    keys = canonical_spots([names[name] for name in args.hands] if args.hands else range(NUM_CLASSES))
+    build_index(args.path, keys, args.samples, args.workers, args.seed, args.chunk, log=print)
+    print("wrote %d spots to %s in %.1fs" % (len(keys), args.path, time.time() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,117 +1,754 @@
 import random
 import math
+from array import array
+from heapq import heapify, heappop, heappush
+from concurrent.futures import ProcessPoolExecutor
 from itertools import combinations
+from math import comb
 import time
-from Evaluator import evaluate_hand
-from Deck import Deck, show_hand
-
-
-class GameStateStat:
-    def __init__(self):
-        self.wins = 0  # number of wins through this game state
-        self.visits = 0  # number of visits to this game state during simulation phase
-
-    def update(self, result):
-        """updates stat of game state"""
-        self.visits += 1
-        self.wins += result
+from statistics import NormalDist
+from Evaluator import PartialHand, evaluate_hand, hand_strength
+from Deck import COMBO_SETS, COMBOS, CardSet, Deck, combo_number, show_hand
+from PreflopTable import preflop_equity
+from EquityCache import canonical_key
+from FlopIndex import flop_lookup
+from Sampling import SAMPLING_MODES, StrataStats, StratifiedDraws, normal_interval, strength_percentiles
+
+
+class OpponentBandit:
+    """selection over the opponent hands still possible at a decision point
+    wins and visits are contiguous arrays indexed by combo number, unvisited hands are tried first in random order
+    explore: UCB1 afterwards, visited hands sit in a max-heap of UCB1 values
+    otherwise (balanced) every further pass visits each hand once more in a new random order"""
+
+    exploration = math.sqrt(2)
+    refresh_growth = 1.05  # rebuild every UCB1 value once the simulation count grew by 5%
+
+    def __init__(self, known_cards, rng, explore=True):
+        self.explore = explore
+        self.rng = rng
+        self.wins = array("d", bytes(8 * len(COMBOS)))  # wins through each opponent hand
+        self.visits = array("d", bytes(8 * len(COMBOS)))  # visits to each opponent hand
+        self.total_simulations = 0
+        self.arms = [combo_number for combo_number, (card_a, card_b) in enumerate(COMBOS)
+                     if card_a not in known_cards and card_b not in known_cards]
+        self.unvisited = self.arms[:]
+        rng.shuffle(self.unvisited)
+        self.heap = []  # (-ucb1 value, combo number) of visited hands
+        self.next_refresh = len(self.arms)
+        self.rate_sum = 0.0  # sum of the visited hands' win rates
+        self.visited = 0  # number of visited hands
+
+    def ucb1(self, combo_number, log_simulations):
+        """calculates an opponent hand's ucb1 value"""
+        visits = self.visits[combo_number]
+        return self.wins[combo_number] / visits + self.exploration * math.sqrt(log_simulations / visits)
+
+    def select(self):
+        """removes and returns the combo number of the next opponent hand: the next one of the pass, or the one with
+        the best ucb1 value"""
+        if self.unvisited:
+            return self.unvisited.pop()
+        if not self.explore:  # new pass
+            self.unvisited = self.arms[:]
+            self.rng.shuffle(self.unvisited)
+            return self.unvisited.pop()
+        return heappop(self.heap)[1]
 
     def win_rate(self):
-        """calculates win rate for current game state"""
-        return self.wins / self.visits if self.visits > 0 else 0
+        """average win rate over the visited opponent hands
+        every opponent hand is equally likely, so each one counts once however often ucb1 picked it"""
+        return self.rate_sum / self.visited if self.visited > 0 else 0
+
+    def update(self, combo_number, result):
+        """records a rollout result for the selected opponent hand and puts it back in the heap"""
+        visits = self.visits[combo_number]
+        if visits > 0:
+            self.rate_sum -= self.wins[combo_number] / visits
+        else:
+            self.visited += 1
+        self.wins[combo_number] += result
+        self.visits[combo_number] = visits + 1
+        self.rate_sum += self.wins[combo_number] / (visits + 1)
+        self.total_simulations += 1
+        if not self.explore:
+            return
+
+        # the log term of every hand grows with the simulation count: refresh all values now and then,
+        # in between only the updated hand is rescored
+        log_simulations = math.log(self.total_simulations + 1)
+        if self.total_simulations >= self.next_refresh and not self.unvisited:
+            self.heap = [(-self.ucb1(arm, log_simulations), arm) for arm in self.arms]
+            heapify(self.heap)
+            self.next_refresh = int(self.total_simulations * self.refresh_growth) + 1
+        else:
+            heappush(self.heap, (-self.ucb1(combo_number, log_simulations), combo_number))
+
+
+def pot_share(my_strength, opponent_strengths):
+    """our share of the pot at showdown: 1 win, 0 loss, 1 / k when k players (us included) split the best hand"""
+    best = max(opponent_strengths)
+    if my_strength > best:
+        return 1
+    if my_strength < best:
+        return 0
+    return 1 / (1 + opponent_strengths.count(best))
+
+
+def combo_win_rate(wins, visits):
+    """average win rate over the visited opponent hands (each hand equally likely) of merged wins/ visits arrays
+    returns (win rate, number of visited opponent hands)"""
+    hand_win_rates = [wins[combo_number] / visits[combo_number] for combo_number in range(len(COMBOS)) if visits[combo_number] > 0]
+    return (sum(hand_win_rates) / len(hand_win_rates) if hand_win_rates else 0), len(hand_win_rates)
+
+
+def wilson_interval(wins, simulations, z):
+    """wilson score interval for a win rate (ties count as half a win) at z standard deviations
+    returns (lower bound, upper bound)"""
+    if simulations == 0:
+        return 0.0, 1.0
+    win_rate = wins / simulations
+    center = win_rate + z * z / (2 * simulations)
+    spread = z * math.sqrt(win_rate * (1 - win_rate) / simulations + z * z / (4 * simulations * simulations))
+    scale = 1 + z * z / simulations
+    return max(0.0, (center - spread) / scale), min(1.0, (center + spread) / scale)
+
+
+STREETS = {0: "preflop", 3: "flop", 4: "turn", 5: "river"}  # number of revealed cards -> street
+PHASES = ("selection", "deck_setup", "sampling", "evaluation")  # timed parts of the rollouts
+MAX_OPPONENTS = 8  # tables seat up to 9 players
+
+
+def check_opponents(my_hand, revealed_cards, num_opponents):
+    """raises ValueError unless num_opponents is a whole number from 1 to MAX_OPPONENTS and the cards left can deal
+    the runout and every opponent's hand (sampling more cards than are left would never finish)"""
+    if isinstance(num_opponents, bool) or not isinstance(num_opponents, int) or \
+            not 1 <= num_opponents <= MAX_OPPONENTS:
+        raise ValueError("Need 1 to %d opponents, got %r" % (MAX_OPPONENTS, num_opponents))
+    if 5 - len(revealed_cards) + 2 * num_opponents > 52 - len(my_hand) - len(revealed_cards):
+        raise ValueError("Not enough cards left to deal %d opponents" % num_opponents)
+
+
+class SearchState:
+    """rollout search of one decision point that can be continued later: the bandit's stats, the deck to sample
+    from and the known cards' partial hands"""
+
+    def __init__(self, my_hand, revealed_cards, rng, num_opponents=1, explore=False):
+        check_opponents(my_hand, revealed_cards, num_opponents)
+        self.my_hand = list(my_hand)
+        self.revealed_cards = list(revealed_cards)
+        self.num_opponents = num_opponents
+        self.rng = rng
+        known_cards = CardSet(my_hand + revealed_cards)  # flipped cards at decision point
+        self.bandit = OpponentBandit(known_cards, rng, explore)
+        self.deck = Deck(rng)
+        self.deck.remove_cards(known_cards)
+        self.to_reveal = 5 - len(revealed_cards)
+        self.to_deal = self.to_reveal + 2 * (num_opponents - 1)
+        self.my_partial = PartialHand(my_hand + revealed_cards)
+        self.board_partial = PartialHand(revealed_cards)
+        self.elapsed = 0.0  # seconds searched so far
+
+    def simulations(self):
+        return self.bandit.total_simulations
 
-    def ucb1(self, total_simulations):
-        """calculates the game state's ucb1 value"""
-        if self.visits == 0:
-            return float('inf')
-        return self.win_rate() + math.sqrt(2) * math.sqrt(math.log(total_simulations) / self.visits)
+    def win_rate(self):
+        return self.bandit.win_rate()
+
+
+class DecisionReport:
+    """telemetry of one decision: how the win rate was computed and where the thinking time went"""
+
+    def __init__(self, street, num_opponents=1):
+        self.street = street
+        self.num_opponents = num_opponents
+        self.method = None  # "preflop_table", "flop_index", "exact" or "mcts"
+        self.decision = None  # "stay" or "fold"
+        self.win_rate = 0
+        self.interval = (0.0, 1.0)  # confidence interval around the win rate
+        self.simulations = 0  # rollouts (mcts, or behind a flop_index equity) or outcomes (exact)
+        self.opponent_hands = 0  # distinct opponent hands visited
+        self.elapsed = 0.0  # seconds
+        self.phase_times = None  # seconds per rollout phase (only recorded when a telemetry hook is set)
+        self.cached = False  # answered from the equity cache
+        self.strength_histogram = None  # flop_index: our final hand rank (0-9) counted over every turn and river
+
+    def rollouts_per_second(self):
+        return self.simulations / self.elapsed if self.elapsed > 0 else 0
+
+    def summary(self):
+        """one line readable summary"""
+        text = "%s %s%s vs %d: %s win rate %.4f [%.4f, %.4f], %d simulations, %d opponent hands, %.3fs (%.0f/s)" % (
+            self.street, self.method, " (cached)" if self.cached else "", self.num_opponents, self.decision, self.win_rate, self.interval[0], self.interval[1],
+            self.simulations, self.opponent_hands, self.elapsed, self.rollouts_per_second())
+        if self.phase_times is not None:
+            text += ", " + ", ".join("%s %.3fs" % (phase, self.phase_times[phase]) for phase in PHASES)
+        return text
 
 
 class PokerBot:
     def __init__(self):
-        self.simulation_time_limit = 10  # 10 second thinking time
+        self.simulation_time_limit = 10  # 10 second thinking time (None = no time limit)
+        self.simulation_limit = None  # max rollouts per decision (None = no limit)
+        self.stay_threshold = 0.5  # heads up: stay if win rate >= threshold (scaled to the fair pot share multiway)
+        self.confidence = 0.99  # stop early once stay/ fold is settled at this confidence (None = never stop early)
+        self.min_simulations = 1000  # rollouts before early stopping is considered
+        self.stop_check_interval = 256  # rollouts between early stopping checks
+        self.enumeration_budget = 100000  # max hand evaluations to compute the exact win rate instead of MCTS
+        self.use_preflop_table = True  # answer preflop decisions from the precomputed equity table
+        self.use_flop_index = True  # answer flop decisions from the precomputed flop index (when one is built)
+        self.num_workers = 1  # rollout processes per decision (os.cpu_count() to use every core)
+        self.seed = None  # master seed for the rollout workers' random streams (None = unseeded)
+        self.telemetry = None  # hook called with the DecisionReport of every decision (also enables phase timing)
+        self.last_report = None  # DecisionReport of the latest decision
+        self.cache = None  # EquityCache shared by suit-isomorphic decisions (None = no caching)
+        self.sampling = "balanced"  # how rollouts draw opponent hands and runouts (see Sampling.SAMPLING_MODES)
+        self.opponent_range = None  # Ranges.Range every opponent's hand is drawn from (None = every hand equally likely)
+
+    def __getstate__(self):
+        """rollout workers get the settings only: hooks and cache connections stay in the parent process"""
+        state = self.__dict__.copy()
+        state.update(telemetry=None, last_report=None, cache=None)
+        return state
 
     def evaluate_hands(self, my_hand, opponent_hand, shared_community_cards):
         """evaluates your hand with opponents hand and determines the terminal state"""
 
-        my_score, my_tiebreakers = evaluate_hand(my_hand + shared_community_cards)
-        opponent_score, opponent_tiebreakers = evaluate_hand(opponent_hand + shared_community_cards)
-        if my_score > opponent_score:  # terminal state: win
+        my_strength = hand_strength(my_hand + shared_community_cards)
+        opponent_strength = hand_strength(opponent_hand + shared_community_cards)
+        if my_strength > opponent_strength:  # terminal state: win
             return 1
-        elif my_score < opponent_score:  # terminal state: loss
+        elif my_strength < opponent_strength:  # terminal state: loss
             return 0
-        else:  # compare tiebreaker cards
-            for my_tb, opponent_tb in zip(my_tiebreakers, opponent_tiebreakers):
-                if my_tb > opponent_tb:
-                    return 1  # win by highest card
-                elif my_tb < opponent_tb:
-                    return 0  # loss by highest card
-        return 0.5  # full tie if tiebreakers don't break ties
-
-    def decide(self, my_hand, revealed_cards):
-        """computes a win rate using MCTS for the current game state-- current hand--
-        and determines whether to stay or fold"""
-
-        start = time.time()  # record start time
-        total_simulations = 0  # number of simulated rollouts completed within time limit per decision point
-        node_stats = {}  # maps opponent hands to NodeStats
+        return 0.5  # full tie: same hand rank and tiebreakers
+
+    def evaluate_showdown(self, my_hand, opponent_hands, shared_community_cards):
+        """evaluates your hand against several opponents' hands, returns your share of the pot"""
+        board = PartialHand(shared_community_cards)  # shared by every player
+        return pot_share(board.strength(my_hand), [board.strength(opponent_hand) for opponent_hand in opponent_hands])
+
+    def win_threshold(self, num_opponents=1):
+        """win rate (pot share) needed to stay: stay_threshold heads up, scaled so 0.5 becomes 1 / players multiway"""
+        return self.stay_threshold * 2 / (num_opponents + 1)
+
+    def count_evaluations(self, my_hand, revealed_cards):
+        """number of hand evaluations needed to enumerate every runout and opponent hand"""
+        remaining = 52 - len(my_hand) - len(revealed_cards)  # cards that can still be flipped
+        to_reveal = 5 - len(revealed_cards)  # number of cards to still be flipped in shared community cards
+        return comb(remaining, to_reveal) * (1 + comb(remaining - to_reveal, 2))  # my hand + each opponent hand
+
+    def exact_win_rate(self, my_hand, revealed_cards, weights=None):
+        """enumerates every runout and opponent hand for the current game state
+        weights: optional weight per combo number of the opponent's hand (an opponent range), hands weighing 0 are skipped
+        returns (win rate counting ties as half a win, number of outcomes enumerated)"""
+
+        known_cards = CardSet(my_hand + revealed_cards)
+        remaining_cards = list(known_cards.complement())
+        to_reveal = 5 - len(revealed_cards)
+
+        wins = 0  # ties count as 0.5
+        outcomes = 0
+        total_weight = 0
+        my_partial = PartialHand(my_hand + revealed_cards)
+        board_partial = PartialHand(revealed_cards)
+        for complete_community_cards in combinations(remaining_cards, to_reveal):
+            my_strength = my_partial.strength(complete_community_cards)
+            shared_community_cards = board_partial.extend(complete_community_cards)  # known for every opponent hand
+            undealt = [card for card in remaining_cards if card not in complete_community_cards]
+            for opponent_hand in combinations(undealt, 2):
+                weight = 1 if weights is None else weights[combo_number(*opponent_hand)]
+                if weight == 0:
+                    continue
+                opponent_strength = shared_community_cards.strength(opponent_hand)
+                if my_strength > opponent_strength:  # terminal state: win
+                    wins += weight
+                elif my_strength == opponent_strength:  # terminal state: draw
+                    wins += 0.5 * weight
+                outcomes += 1
+                total_weight += weight
+
+        if total_weight == 0:
+            raise ValueError("Every hand of the range is blocked by the known cards")
+        return wins / total_weight, outcomes
+
+    def decide(self, my_hand, revealed_cards, num_opponents=1):
+        """computes a win rate for the current game state-- current hand-- and determines whether to stay or fold
+        preflop table lookup, exact when every outcome fits in the enumeration budget (turn and river), MCTS otherwise
+        num_opponents > 1: the win rate is our expected share of the pot (split pots included), always MCTS
+        with an opponent_range the cache and the preflop table are skipped (both assume every hand is equally likely)"""
+
+        check_opponents(my_hand, revealed_cards, num_opponents)
+        start = time.perf_counter()
+        report = DecisionReport(STREETS.get(len(revealed_cards), "street with %d cards" % len(revealed_cards)),
+                                num_opponents)
+        heads_up = num_opponents == 1
+        uniform = self.opponent_range is None
+        # rollout estimates depend on the sampling mode (ucb is biased), so it is part of the key
+        cache_key = None
+        if self.cache is not None and uniform:
+            cache_key = "%s:%s" % (canonical_key(my_hand, revealed_cards, num_opponents), self.sampling)
+        cached = self.cache.get(cache_key) if cache_key is not None else None
+
+        if cached is not None and self.cached_report(report, cached):
+            pass  # answered by the equity cache
+        elif heads_up and uniform and self.precomputed_report(report, my_hand, revealed_cards):
+            pass  # answered by the preflop table or the flop index
+        elif heads_up and self.count_evaluations(my_hand, revealed_cards) <= self.enumeration_budget:
+            report.method = "exact"
+            if uniform:
+                report.win_rate, report.simulations = self.exact_win_rate(my_hand, revealed_cards)
+                report.opponent_hands = comb(52 - len(my_hand) - len(revealed_cards), 2)
+            else:
+                report.win_rate, report.simulations = self.exact_win_rate(my_hand, revealed_cards,
+                                                                          self.opponent_range.weights)
+                report.opponent_hands = len(self.opponent_range.alias(CardSet(my_hand + revealed_cards)).combos)
+            report.interval = (report.win_rate, report.win_rate)
+        else:
+            report.method = "mcts"
+            report.win_rate = self.mcts_win_rate(my_hand, revealed_cards, report, num_opponents)
+
+        if cache_key is not None and not report.cached and report.method not in ("preflop_table", "flop_index") \
+                and (cached is None or report.simulations >= cached[2]):  # never replace a better estimate
+            self.cache.put(cache_key, report.win_rate, report.method, report.simulations)
+        report.elapsed = time.perf_counter() - start
+        return self.finish_report(report)
+
+    def cached_report(self, report, cached):
+        """fills a report from a cached (win rate, method, simulations) when it is as good as a new search
+        returns whether it was: exact results always are, rollout estimates only when they used at least
+        simulation_limit rollouts or their interval already settles the decision at the current confidence"""
+        win_rate, method, simulations = cached
+        if method == "mcts":
+            z = NormalDist().inv_cdf((1 + (self.confidence or 0.95)) / 2)
+            interval = wilson_interval(win_rate * simulations, simulations, z)
+            threshold = self.win_threshold(report.num_opponents)
+            settled = self.stopping_z() is not None and not interval[0] <= threshold <= interval[1]
+            if not settled and (self.simulation_limit is None or simulations < self.simulation_limit):
+                return False
+        else:
+            interval = (win_rate, win_rate)
+        report.win_rate, report.method, report.simulations, report.interval = win_rate, method, simulations, interval
+        report.cached = True
+        return True
+
+    def precomputed_report(self, report, my_hand, revealed_cards):
+        """fills a heads up report from the preflop table or the flop index when they hold the spot
+        a flop index equity is sampled: when its interval contains the stay/ fold threshold the rollouts decide
+        (only the exact strength histogram is kept)
+        returns whether they did"""
+        if self.use_preflop_table and not revealed_cards:
+            win_rate = preflop_equity(my_hand)
+            if win_rate is None:
+                return False
+            report.method = "preflop_table"
+            report.win_rate = win_rate
+            report.interval = (win_rate, win_rate)
+            return True
+        if self.use_flop_index and len(revealed_cards) == 3:
+            found = flop_lookup(my_hand, revealed_cards)
+            if found is None:
+                return False
+            win_rate, samples, report.strength_histogram = found
+            z = NormalDist().inv_cdf((1 + (self.confidence or 0.95)) / 2)
+            interval = wilson_interval(win_rate * samples, samples, z)
+            if interval[0] <= self.win_threshold(1) <= interval[1]:
+                return False  # too close to call from the index
+            report.method = "flop_index"
+            report.win_rate, report.simulations, report.interval = win_rate, samples, interval
+            return True
+        return False
+
+    def stopping_z(self):
+        """z value of the early stopping interval, None when the search must not stop early: no confidence set, or
+        ucb sampling (an adaptively sampled estimate has no valid interval to stop on)"""
+        if self.confidence is None or self.sampling == "ucb":
+            return None
+        return NormalDist().inv_cdf((1 + self.confidence) / 2)
+
+    def finish_report(self, report, telemetry=True):
+        """settles a report's stay/ fold decision, records it as the latest report and passes it to the telemetry hook
+        returns the decision"""
+        report.decision = "stay" if report.win_rate >= self.win_threshold(report.num_opponents) else "fold"
+        self.last_report = report
+        if telemetry and self.telemetry is not None:
+            self.telemetry(report)
+        return report.decision
+
+    def search(self, my_hand, revealed_cards, num_opponents=1):
+        """new resumable rollout search of a decision point, to pass to decide_iter
+        the search keeps per opponent hand stats: balanced or ucb sampling only"""
+        assert self.sampling in ("balanced", "ucb"), \
+            "Resumable searches run balanced or ucb rollouts only, use decide for %r sampling" % self.sampling
+        return SearchState(my_hand, revealed_cards, random.Random(self.seed), num_opponents, self.sampling == "ucb")
+
+    def decide_iter(self, my_hand, revealed_cards, num_opponents=1, report_interval=0.1, state=None, cancel=None):
+        """anytime decide: yields a DecisionReport with the estimate so far every report_interval seconds
+        the search runs in this process until simulation_time_limit, simulation_limit (both counted per call) or a
+        settled decision, the last report yielded is the final one
+        stopping early: break out of the loop (or close() the generator), or set cancel (anything with is_set(),
+        e.g. threading.Event) from another thread, it is checked between reports
+        state: SearchState from search() to continue, calling again with it refines the estimate instead of starting
+        over (without a state, preflop table, flop index and exact answers are yielded once like decide)
+        balanced or ucb sampling only, without an opponent range (use decide for the others)"""
+
+        check_opponents(my_hand, revealed_cards, num_opponents)
+        assert self.opponent_range is None, "decide_iter doesn't support opponent ranges"
+        assert self.sampling in ("balanced", "ucb"), \
+            "decide_iter runs balanced or ucb rollouts only, use decide for %r sampling" % self.sampling
+        start = time.perf_counter()
+        street = STREETS.get(len(revealed_cards), "street with %d cards" % len(revealed_cards))
+        if state is None:
+            heads_up = num_opponents == 1
+            report = DecisionReport(street, num_opponents)
+            if heads_up and self.precomputed_report(report, my_hand, revealed_cards):
+                pass  # answered by the preflop table or the flop index
+            elif heads_up and self.count_evaluations(my_hand, revealed_cards) <= self.enumeration_budget:
+                report.method = "exact"
+                report.win_rate, report.simulations = self.exact_win_rate(my_hand, revealed_cards)
+                report.interval = (report.win_rate, report.win_rate)
+                report.opponent_hands = comb(52 - len(my_hand) - len(revealed_cards), 2)
+            if report.method is not None:
+                report.elapsed = time.perf_counter() - start
+                self.finish_report(report)
+                yield report
+                return
+            state = self.search(my_hand, revealed_cards, num_opponents)
+        assert (sorted(state.my_hand), sorted(state.revealed_cards), state.num_opponents) == \
+            (sorted(my_hand), sorted(revealed_cards), num_opponents), "SearchState of a different decision point"
+
+        z = NormalDist().inv_cdf((1 + (self.confidence or 0.95)) / 2)
+        threshold = self.win_threshold(num_opponents)
+        deadline = time.time() + self.simulation_time_limit if self.simulation_time_limit is not None else math.inf
+        budget = self.simulation_limit
+        searched = state.elapsed
+        report = None
+        try:
+            while True:
+                _, _, simulations, _ = self.run_rollouts(my_hand, revealed_cards, min(deadline, time.time() + report_interval),
+                                                         state.rng, budget, False, num_opponents, state)
+                if budget is not None:
+                    budget -= simulations
+                state.elapsed = searched + time.perf_counter() - start
+
+                report = DecisionReport(street, num_opponents)
+                report.method = "mcts"
+                report.win_rate = state.win_rate()
+                report.simulations = state.simulations()
+                report.opponent_hands = state.bandit.visited
+                report.interval = wilson_interval(report.win_rate * report.simulations, report.simulations, z)
+                report.elapsed = state.elapsed
+                self.finish_report(report, telemetry=False)
+
+                settled = (self.stopping_z() is not None and report.simulations >= self.min_simulations and
+                           (report.interval[0] >= threshold or report.interval[1] < threshold))
+                finished = (settled or time.time() >= deadline or budget == 0 or
+                            (cancel is not None and cancel.is_set()))
+                yield report
+                if finished:
+                    break
+        finally:
+            if report is not None and self.telemetry is not None:
+                self.telemetry(report)  # the final (or last seen, when stopped early) estimate
+
+    def worker_seeds(self):
+        """one independent seed per rollout worker, all derived from the master seed"""
+        seed_stream = random.Random(self.seed)
+        return [seed_stream.getrandbits(64) for _ in range(max(1, self.num_workers))]
+
+    def mcts_win_rate(self, my_hand, revealed_cards, report=None, num_opponents=1):
+        """computes a win rate using MCTS within the thinking time and/ or simulation budget
+        rollouts are split across num_workers processes, each with its own random stream derived from the master seed
+        report: optional DecisionReport to fill with simulations, opponent hands, interval and phase times"""
+
+        # every worker stops at the same time and gets an even share of the simulation budget
+        deadline = time.time() + self.simulation_time_limit if self.simulation_time_limit is not None else math.inf
+        worker_rngs = [random.Random(worker_seed) for worker_seed in self.worker_seeds()]
+        if self.simulation_limit is None:
+            worker_limits = [None] * len(worker_rngs)
+        else:
+            share, extra = divmod(self.simulation_limit, len(worker_rngs))
+            worker_limits = [share + (i < extra) for i in range(len(worker_rngs))]
+
+        if self.sampling not in ("balanced", "ucb") or self.opponent_range is not None:
+            return self.sampled_win_rate(my_hand, revealed_cards, deadline, worker_rngs, worker_limits, report,
+                                         num_opponents)
+
+        timed = self.telemetry is not None
+
+        if len(worker_rngs) == 1:
+            results = [self.run_rollouts(my_hand, revealed_cards, deadline, worker_rngs[0], worker_limits[0], timed,
+                                         num_opponents)]
+        else:
+            with ProcessPoolExecutor(max_workers=len(worker_rngs)) as pool:
+                futures = [pool.submit(self.run_rollouts, my_hand, revealed_cards, deadline, rng, limit, timed, num_opponents)
+                           for rng, limit in zip(worker_rngs, worker_limits)]
+                results = [future.result() for future in futures]
 
-        # set up game state
-        full_deck = set(range(52))
-        known_cards = set(my_hand + revealed_cards)  # flipped cards at decision point
-        remaining_cards = list(full_deck - known_cards)  #  # cards that can still be flipped
-        possible_opponent_hand = list(combinations(remaining_cards, 2))  # list of all the possible opponent hands
+        # BACKPROPAGATION
+        wins = array("d", bytes(8 * len(COMBOS)))  # merge every worker's per opponent hand stats
+        visits = array("d", bytes(8 * len(COMBOS)))
+        total_simulations = 0
+        phase_times = dict.fromkeys(PHASES, 0.0) if timed else None  # summed over workers (cpu time, not wall time)
+        for worker_wins, worker_visits, worker_simulations, worker_phase_times in results:
+            for combo_number in range(len(COMBOS)):
+                wins[combo_number] += worker_wins[combo_number]
+                visits[combo_number] += worker_visits[combo_number]
+            total_simulations += worker_simulations
+            if timed:
+                for phase in PHASES:
+                    phase_times[phase] += worker_phase_times[phase]
+
+        win_rate, opponent_hands = combo_win_rate(wins, visits)
+
+        if report is not None:
+            z = NormalDist().inv_cdf((1 + (self.confidence or 0.95)) / 2)
+            report.simulations = total_simulations
+            report.opponent_hands = opponent_hands
+            report.interval = wilson_interval(win_rate * total_simulations, total_simulations, z)
+            report.phase_times = phase_times
+
+        return win_rate
+
+    def sampling_strata(self, my_hand, revealed_cards):
+        """(strength percentiles of the control variate or None, stratum weights) of the sampling mode
+        stratified/ control: one stratum per opponent hand, all equally likely, control also adjusts on our strength
+        percentile (not when the runouts are too many to enumerate, i.e. preflop)
+        uniform: a single stratum
+        with an opponent_range the opponent hands are weighed by the range and control adjusts on nothing (the
+        range's card removal makes the runouts, and so the percentile's mean, no longer uniform)"""
+        assert self.sampling in SAMPLING_MODES, "Unknown sampling mode %r" % self.sampling
+        if self.sampling not in ("stratified", "control"):
+            return None, [1]
+        if self.opponent_range is not None:
+            self.opponent_range.alias(CardSet(my_hand + revealed_cards))  # drops the blocked hands' weights
+            return None, list(self.opponent_range.live_weights)
+        percentiles = strength_percentiles(my_hand, revealed_cards, budget=self.enumeration_budget) \
+            if self.sampling == "control" else None
+        return percentiles, [1] * len(COMBOS)
+
+    def sampled_win_rate(self, my_hand, revealed_cards, deadline, worker_rngs, worker_limits, report=None,
+                         num_opponents=1):
+        """mcts_win_rate for the variance reduced sampling modes: stratified estimate over the merged worker stats,
+        its interval comes from the estimated standard error instead of a binomial one"""
+        percentiles, weights = self.sampling_strata(my_hand, revealed_cards)
+        if len(worker_rngs) == 1:
+            results = [self.run_sampled_rollouts(my_hand, revealed_cards, deadline, worker_rngs[0], worker_limits[0],
+                                                 num_opponents, percentiles, weights)]
+        else:
+            with ProcessPoolExecutor(max_workers=len(worker_rngs)) as pool:
+                futures = [pool.submit(self.run_sampled_rollouts, my_hand, revealed_cards, deadline, rng, limit,
+                                       num_opponents, percentiles, weights)
+                           for rng, limit in zip(worker_rngs, worker_limits)]
+                results = [future.result() for future in futures]
+
+        stats = StrataStats(len(weights), percentiles is not None)
+        seen = bytearray(len(COMBOS))
+        for worker_stats, worker_seen in results:
+            stats.merge(worker_stats)
+            seen = bytearray(a | b for a, b in zip(seen, worker_seen))
+        win_rate, standard_error = stats.estimate(weights, 0.5 if percentiles is not None else None)
+
+        if report is not None:
+            z = NormalDist().inv_cdf((1 + (self.confidence or 0.95)) / 2)
+            report.simulations = stats.simulations()
+            report.opponent_hands = sum(seen)
+            report.interval = normal_interval(win_rate, standard_error, z)
+        return win_rate
+
+    def run_sampled_rollouts(self, my_hand, revealed_cards, deadline, rng, max_simulations=None, num_opponents=1,
+                             percentiles=None, weights=(1,)):
+        """rollouts of the uniform/ stratified/ control sampling modes until the deadline, max_simulations or a
+        settled decision (same evaluation as run_rollouts, no ucb1)
+        percentiles, weights: our strength percentiles (control variate) and stratum weights from sampling_strata
+        with an opponent_range every opponent hand comes from the range's alias table (O(1) per draw, hands overlapping
+        an earlier opponent are drawn again) and the runout is sampled around all of them
+        returns (StrataStats, opponent hands seen as a bytearray over combo numbers)"""
+
+        z = self.stopping_z()
+        check_opponents(my_hand, revealed_cards, num_opponents)
+        threshold = self.win_threshold(num_opponents)
+        known_cards = CardSet(my_hand + revealed_cards)
+        deck = Deck(rng)
+        deck.remove_cards(known_cards)
+        arms = [combo_number for combo_number, combo_set in enumerate(COMBO_SETS) if combo_set.isdisjoint(known_cards)]
+        to_reveal = 5 - len(revealed_cards)
+        to_deal = to_reveal + 2 * (num_opponents - 1)
+        alias = self.opponent_range.alias(known_cards) if self.opponent_range is not None else None
+        if alias is not None:
+            arms = alias.combos  # hands outside the range never come up
+        my_partial = PartialHand(my_hand + revealed_cards)
+        board_partial = PartialHand(revealed_cards)
+        stratified = self.sampling in ("stratified", "control")
+        draws = StratifiedDraws(arms, COMBOS, deck.cards, to_reveal, rng) if stratified else None
+        random_float = rng.random
+
+        stats = StrataStats(len(weights), percentiles is not None)
+        counts, sums, squares = stats.counts, stats.sums, stats.squares
+        controls, control_squares, products = stats.controls, stats.control_squares, stats.products
+        control_mean = 0.5 if percentiles is not None else None
+        seen = bytearray(len(COMBOS))
+        simulations = 0
+        next_check = self.min_simulations
+        while time.time() < deadline and (max_simulations is None or simulations < max_simulations):
+
+            # EARLY STOPPING: checked at a growing interval, the stratified estimate costs a pass over the strata
+            if z is not None and simulations >= next_check:
+                next_check = max(simulations + self.stop_check_interval, int(simulations * 1.05))
+                lower, upper = normal_interval(*stats.estimate(weights, control_mean), z)
+                if lower >= threshold or upper < threshold:
+                    break
+
+            if alias is not None and (not stratified or num_opponents > 1):
+                combo_number = draws.next()[0] if stratified else alias.sample(random_float)
+                if num_opponents == 1:
+                    dealt = deck.sample(to_reveal, COMBO_SETS[combo_number])
+                else:
+                    used = COMBO_SETS[combo_number].mask
+                    others = []
+                    rejections = 0
+                    while len(others) < to_deal - to_reveal:
+                        other = alias.sample(random_float)
+                        if COMBO_SETS[other].mask & used:
+                            rejections += 1
+                            if rejections > 10000:
+                                raise ValueError("The range is too narrow to deal %d opponents" % num_opponents)
+                            continue
+                        used |= COMBO_SETS[other].mask
+                        others.extend(COMBOS[other])
+                    dealt = deck.sample(to_reveal, CardSet(mask=used)) + others
+            elif stratified:
+                combo_number, first_card = draws.next()
+                if first_card is None:
+                    dealt = deck.sample(to_deal, COMBO_SETS[combo_number])
+                else:
+                    dealt = [first_card] + deck.sample(to_deal - 1,
+                                                      CardSet(mask=COMBO_SETS[combo_number].mask | 1 << first_card))
+            else:
+                combo_number = arms[int(random_float() * len(arms))]
+                dealt = deck.sample(to_deal, COMBO_SETS[combo_number])
+            choose = COMBOS[combo_number]
+            complete_community_cards = dealt[:to_reveal]
+
+            my_strength = my_partial.strength(complete_community_cards)
+            if num_opponents == 1:
+                opponent_strength = board_partial.strength(list(choose) + complete_community_cards)
+                terminal_state = 1 if my_strength > opponent_strength else 0 if my_strength < opponent_strength else 0.5
+            else:
+                shared_community_cards = board_partial.extend(complete_community_cards)
+                opponent_strengths = [shared_community_cards.strength(choose)]
+                for i in range(to_reveal, to_deal, 2):
+                    opponent_strengths.append(shared_community_cards.strength(dealt[i:i + 2]))
+                terminal_state = pot_share(my_strength, opponent_strengths)
+
+            stratum = combo_number if stratified else 0
+            counts[stratum] += 1
+            sums[stratum] += terminal_state
+            squares[stratum] += terminal_state * terminal_state
+            if percentiles is not None:
+                control = percentiles[my_strength]
+                controls[stratum] += control
+                control_squares[stratum] += control * control
+                products[stratum] += control * terminal_state
+            seen[combo_number] = 1
+            simulations += 1
+
+        return stats, seen
+
+    def run_rollouts(self, my_hand, revealed_cards, deadline, rng, max_simulations=None, timed=False, num_opponents=1,
+                     state=None):
+        """runs MCTS rollouts until the deadline (time.time() value), max_simulations or a settled decision
+        using the given random.Random stream (balanced or ucb sampling mode)
+        timed: record seconds spent per phase (costs a few clock reads per rollout)
+        num_opponents: the bandit picks the first opponent's hand, the others are dealt with the runout from the same deck
+        and every player's hand is evaluated once against the shared board
+        state: SearchState of an earlier run on the same decision point to continue (its own rng is used)
+        returns (wins per opponent combo, visits per opponent combo, number of simulations in this run,
+        phase times or None)"""
+
+        z = self.stopping_z()
+        phase_times = dict.fromkeys(PHASES, 0.0) if timed else None
+        selection_time = sampling_time = evaluation_time = 0.0
+        clock = time.perf_counter
+        setup_start = clock()
 
+        # set up game state
+        if state is None:
+            state = SearchState(my_hand, revealed_cards, rng, num_opponents, self.sampling == "ucb")
+        bandit = state.bandit  # all the possible opponent hands
+        deck = state.deck  # one deck per decision: rollouts sample from it without removing cards
+        to_reveal = state.to_reveal  # number of cards to still be flipped in shared community cards
+        to_deal = state.to_deal  # runout + the other opponents' hands
+        threshold = self.win_threshold(num_opponents)
+        my_partial = state.my_partial  # known cards are counted once per decision
+        board_partial = state.board_partial
+        if timed:
+            phase_times["deck_setup"] = clock() - setup_start
+
+        total_simulations = start_simulations = bandit.total_simulations  # earlier runs at this decision point count
+        stop_simulations = math.inf if max_simulations is None else start_simulations + max_simulations
         # simulate rollouts within time limit (thinking time for decision-making)
-        while time.time() - start < self.simulation_time_limit:
+        while time.time() < deadline and total_simulations < stop_simulations:
+
+            # EARLY STOPPING: the interval around the win rate no longer contains the stay/ fold threshold
+            # (balanced passes give every opponent hand the same share of rollouts: stratified sampling with
+            # proportional allocation, whose variance is at most the binomial one the wilson interval assumes)
+            # not checked before this run's first rollout: a resumed state that stopped settled would never move
+            if z is not None and total_simulations > start_simulations and total_simulations >= self.min_simulations \
+                    and total_simulations % self.stop_check_interval == 0:
+                lower, upper = wilson_interval(bandit.win_rate() * total_simulations, total_simulations, z)
+                if lower >= threshold or upper < threshold:
+                    break
 
             # SELECTION
-            best_ucb1 = float('-inf')  # by default
-            choose = None  # node/ game state to choose in MCTS traversal
-
-            # randomly sample a possible opponent hand
-            for opponent_hand in random.sample(possible_opponent_hand, k=min(len(possible_opponent_hand), 100)):
-                opponent_key = tuple(sorted(opponent_hand))
-                curr_stats = node_stats.get(opponent_key, GameStateStat())  # get current game state stat
-                ucb1_value = curr_stats.ucb1(total_simulations + 1)  # evaluate ucb1 value for current game state
-                if ucb1_value > best_ucb1:  # determine best game state from root
-                    best_ucb1 = ucb1_value
-                    choose = opponent_key
-
-            if not choose:  # in case no assignment is made (failed to determine which game state from root is best)
-                continue
+            if timed:
+                phase_start = clock()
+            combo_number = bandit.select()  # next opponent hand of the pass (balanced) or best ucb1 value (ucb)
+            choose = COMBOS[combo_number]
 
             # EXPANSION + SIMULATION
-            deck = Deck()
-            deck.remove_cards(my_hand + revealed_cards + list(choose))  # create an instance of the current deck updated with current game state
-
-            to_reveal = 5 - len(revealed_cards)  # number of cards to still be flipped in shared community cards
-            complete_community_cards = deck.sample(to_reveal)  # randomly sample cards that need to flipped in shared community cards
-            shared_community_cards = revealed_cards + complete_community_cards  # full set of community cards
-
-            # determine terminal state: win/ loss/ draw
-            terminal_state = self.evaluate_hands(my_hand, list(choose), shared_community_cards)
-
-            # update game state's stat for opponent hand
-            if choose not in node_stats:  # create key and stat structure
-                node_stats[choose] = GameStateStat()
-            node_stats[choose].update(terminal_state)  # update wins and visits
+            # randomly sample cards that need to flipped in shared community cards, skipping the opponent's hand
+            if timed:
+                sampling_start = clock()
+            dealt = deck.sample(to_deal, COMBO_SETS[combo_number])
+            complete_community_cards = dealt[:to_reveal]
+
+            # determine terminal state: win/ loss/ draw (only the sampled cards are added to the known ones)
+            if timed:
+                evaluation_start = clock()
+            my_strength = my_partial.strength(complete_community_cards)
+            if num_opponents == 1:
+                opponent_strength = board_partial.strength(list(choose) + complete_community_cards)
+                terminal_state = 1 if my_strength > opponent_strength else 0 if my_strength < opponent_strength else 0.5
+            else:  # complete the board once, then add each opponent's hole cards to it
+                shared_community_cards = board_partial.extend(complete_community_cards)
+                opponent_strengths = [shared_community_cards.strength(choose)]
+                for i in range(to_reveal, to_deal, 2):
+                    opponent_strengths.append(shared_community_cards.strength(dealt[i:i + 2]))
+                terminal_state = pot_share(my_strength, opponent_strengths)
+
+            # update opponent hand's stats
+            if timed:
+                update_start = clock()
+            bandit.update(combo_number, terminal_state)
             total_simulations += 1  # simulated rollout completed -> increment value
+            if timed:
+                phase_end = clock()
+                selection_time += sampling_start - phase_start + phase_end - update_start
+                sampling_time += evaluation_start - sampling_start
+                evaluation_time += update_start - evaluation_start
 
-        # BACKPROPAGATION
-        total_wins = sum(game_states.wins for game_states in node_stats.values())  # calculate total number of wins during simulation phase
-        win_rate = total_wins / total_simulations if total_simulations > 0 else 0  # calculate average win rate over completed simulations
-
-        print("simulations ran: ", total_simulations)
-        print("win rate: ", win_rate)
+        if timed:
+            phase_times["selection"] = selection_time
+            phase_times["sampling"] = sampling_time
+            phase_times["evaluation"] = evaluation_time
 
-        return "stay" if win_rate >= 0.5 else "fold"
+        return bandit.wins, bandit.visits, total_simulations - start_simulations, phase_times
 
 
-def random_setup():
-    """randomly deals"""
+def random_setup(rng=None):
+    """randomly deals (rng: optional random.Random instance)"""
     # create an instance of a deck
-    deck = Deck()
+    deck = Deck(rng)
 
     # deal cards
     my_hole = deck.draw(2)  # my hole cards
@@ -121,62 +758,69 @@ def random_setup():
     return my_hole, shared_community_cards, opponent_hole
 
 
-def simulate_game(my_hand, community_cards, opponent_hand):
-    """simulates a full texas hold em game"""
+def simulate_game(my_hand, community_cards, opponent_hand, ask=input, show=print, bot=None):
+    """simulates a full texas hold em game
+    ask: asks the player a question and returns the answer (input by default, any callable for a headless game)
+    show: prints a line of game output (print by default)
+    bot: PokerBot giving the advice (a new one by default)"""
 
     # create bot-- for MCTS
-    bot = PokerBot()
+    if bot is None:
+        bot = PokerBot()
 
     # pre flop
-    print("Pre-Flop -> my hand: ", show_hand(my_hand))
-    print("Bot computing win rate...")
+    show("Pre-Flop -> my hand: ", show_hand(my_hand))
+    show("Bot computing win rate...")
     decision = bot.decide(my_hand, [])
-    print("Bot Decision: ", decision)
-    user_decision = input("Do you want to stay or fold? (stay/fold): ").strip().lower()
+    show(bot.last_report.summary())
+    show("Bot Decision: ", decision)
+    user_decision = ask("Do you want to stay or fold? (stay/fold): ").strip().lower()
     if user_decision == "fold":
-        print("You folded.")
+        show("You folded.")
         return -1
 
     # pre turn
-    print("Pre-Turn -> my hand: ", show_hand(my_hand))
-    print("Pre-Turn -> community cards: ", show_hand(community_cards[:3]))
-    print("Bot computing win rate...")
+    show("Pre-Turn -> my hand: ", show_hand(my_hand))
+    show("Pre-Turn -> community cards: ", show_hand(community_cards[:3]))
+    show("Bot computing win rate...")
     decision = bot.decide(my_hand, community_cards[:3])
-    print("Bot Decision: ", decision)
-    user_decision = input("Do you want to stay or fold? (stay/fold): ").strip().lower()
+    show(bot.last_report.summary())
+    show("Bot Decision: ", decision)
+    user_decision = ask("Do you want to stay or fold? (stay/fold): ").strip().lower()
     if user_decision == "fold":
-        print("You folded.")
+        show("You folded.")
         return -1
 
     # pre river
-    print("Pre-River -> my hand: ", show_hand(my_hand))
-    print("Pre-River -> community cards: ", show_hand(community_cards[:4]))
-    print("Bot computing win rate...")
+    show("Pre-River -> my hand: ", show_hand(my_hand))
+    show("Pre-River -> community cards: ", show_hand(community_cards[:4]))
+    show("Bot computing win rate...")
     decision = bot.decide(my_hand, community_cards[:4])
-    print("Bot Decision: ", decision)
-    user_decision = input("Do you want to stay or fold? (stay/fold): ").strip().lower()
+    show(bot.last_report.summary())
+    show("Bot Decision: ", decision)
+    user_decision = ask("Do you want to stay or fold? (stay/fold): ").strip().lower()
     if user_decision == "fold":
-        print("You folded.")
+        show("You folded.")
         return -1
 
     # river revealing
-    print("Final Round -> my hand: ", show_hand(my_hand))
-    print("Final Round -> community cards: ", show_hand(community_cards))
-    print("Final Round -> opponent's hand: ", show_hand(opponent_hand))
+    show("Final Round -> my hand: ", show_hand(my_hand))
+    show("Final Round -> community cards: ", show_hand(community_cards))
+    show("Final Round -> opponent's hand: ", show_hand(opponent_hand))
     my_hand_eval = evaluate_hand(my_hand + community_cards)
     opponent_hand_eval = evaluate_hand(opponent_hand + community_cards)
     result = bot.evaluate_hands(my_hand, opponent_hand, community_cards)
-    print("Your hand evaluation: ", my_hand_eval)
-    print("Opponent's hand evaluation: ", opponent_hand_eval)
+    show("Your hand evaluation: ", my_hand_eval)
+    show("Opponent's hand evaluation: ", opponent_hand_eval)
 
     if result == 1:
-        print("You won!")
+        show("You won!")
         return 1
     elif result == 0:
-        print("You lost!")
+        show("You lost!")
         return 0
     else:
-        print("It was a draw!")
+        show("It was a draw!")
         return 0.5
 
 
@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import random
+import argparse
+from array import array
+from Evaluator import hand_strength, evaluate_hands_batch, np, rank, suit
+
+
+# 169 strategically distinct starting hands laid out on a 13x13 grid (row/ column = rank, 12 = ace)
+# - pairs on the diagonal: (r, r)
+# - suited hands above it: (high, low)
+# - offsuit hands below it: (low, high)
+NUM_CLASSES = 169
+RANK_NAMES = "23456789TJQKA"
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preflop_equity.bin")
+TABLE_MAGIC = b"PKPF"
+TABLE_VERSION = 1
+
+
+def starting_hand_class(hole):
+    """maps 2 hole cards to their starting hand class (0-168)"""
+    high, low = sorted((rank(hole[0]), rank(hole[1])), reverse=True)
+    if suit(hole[0]) == suit(hole[1]):
+        return 13 * high + low
+    return 13 * low + high
+
+
+def class_name(hand_class):
+    """readable name of a starting hand class: pairs "TT", suited "AKs", offsuit "72o" """
+    row, column = divmod(hand_class, 13)
+    if row == column:
+        return RANK_NAMES[row] * 2
+    if row > column:
+        return RANK_NAMES[row] + RANK_NAMES[column] + "s"
+    return RANK_NAMES[column] + RANK_NAMES[row] + "o"
+
+
+def class_hole_cards(hand_class):
+    """representative hole cards for a starting hand class (clubs, plus diamonds when not suited)"""
+    row, column = divmod(hand_class, 13)
+    if row > column:  # suited
+        return [row, column]
+    return [column, 13 + row]
+
+
+def simulate_equity(hole, samples, rng):
+    """monte carlo equity (wins + ties / 2) of hole cards against a random hand over random boards
+    rng: random.Random instance (its seed also seeds numpy when batch evaluation is available)"""
+
+    remaining = [card for card in range(52) if card not in hole]
+
+    if np is None:
+        wins = 0
+        for _ in range(samples):
+            dealt = rng.sample(remaining, 7)  # opponent hand + board
+            board = dealt[2:]
+            my_strength, opponent_strength = hand_strength(hole + board), hand_strength(dealt)
+            wins += 1 if my_strength > opponent_strength else 0.5 if my_strength == opponent_strength else 0
+        return wins / samples
+
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    remaining = np.array(remaining)
+    wins = 0.0
+    for start in range(0, samples, 100000):  # bounded memory per chunk
+        size = min(100000, samples - start)
+        dealt = remaining[np.argpartition(np_rng.random((size, len(remaining))), 7, axis=1)[:, :7]]
+        board = dealt[:, 2:]
+        my_strength = evaluate_hands_batch(np.hstack([np.broadcast_to(hole, (size, 2)), board]))
+        opponent_strength = evaluate_hands_batch(dealt)
+        wins += np.count_nonzero(my_strength > opponent_strength) + 0.5 * np.count_nonzero(my_strength == opponent_strength)
+    return wins / samples
+
+
+def build_table(samples, seed=None, log=None):
+    """estimates the equity of every starting hand class with `samples` rollouts each"""
+    rng = random.Random(seed)
+    table = array("f")
+    for hand_class in range(NUM_CLASSES):
+        table.append(simulate_equity(class_hole_cards(hand_class), samples, rng))
+        if log is not None:
+            log("%s %.4f" % (class_name(hand_class), table[-1]))
+    return table
+
+
+def write_table(path, table, samples):
+    """persists the table: header (magic, version, samples per class) then 169 float32 equities"""
+    with open(path, "wb") as f:
+        f.write(TABLE_MAGIC)
+        f.write(array("I", [TABLE_VERSION, samples]).tobytes())
+        f.write(table.tobytes())
+
+
+def read_table(path=TABLE_PATH):
+    """loads a table written by write_table, returns None if it is missing or stale"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if data[:4] != TABLE_MAGIC or len(data) != 12 + 4 * NUM_CLASSES:
+        return None
+    version, samples = array("I", data[4:12])
+    if version != TABLE_VERSION:
+        return None
+    return array("f", data[12:])
+
+
+TABLE = read_table()
+
+
+def preflop_equity(hole):
+    """equity of hole cards against a random hand from the precomputed table (None if there is no table)"""
+    if TABLE is None:
+        return None
+    return TABLE[starting_hand_class(hole)]
+
+
+def check_table(table, samples, seed=None, log=None):
+    """re-estimates every class with an independent monte carlo run
+    returns the largest absolute difference from the table"""
+    rng = random.Random(seed)
+    worst = 0
+    for hand_class in range(NUM_CLASSES):
+        equity = simulate_equity(class_hole_cards(hand_class), samples, rng)
+        error = abs(equity - table[hand_class])
+        worst = max(worst, error)
+        if log is not None:
+            log("%s table %.4f check %.4f error %.4f" % (class_name(hand_class), table[hand_class], equity, error))
+    return worst
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="build or check the preflop equity table")
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("--samples", type=int, default=1000000, help="rollouts per starting hand class")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--path", default=TABLE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.005, help="max allowed error when checking")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    if args.command == "build":
+        table = build_table(args.samples, args.seed, log=print)
+        write_table(args.path, table, args.samples)
+        print("wrote %s in %.1fs" % (args.path, time.time() - start))
+        return 0
+
+    table = read_table(args.path)
+    if table is None:
+        print("no preflop table at %s, run: python PreflopTable.py build" % args.path)
+        return 1
+    worst = check_table(table, args.samples, args.seed, log=print)
+    print("max error: %.4f (tolerance %.4f) in %.1fs" % (worst, args.tolerance, time.time() - start))
+    return 0 if worst <= args.tolerance else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
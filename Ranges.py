@@ -0,0 +1,164 @@
+import random
+from array import array
+from Deck import COMBOS, combo_number, parse_card
+
+
+RANK_CHARACTERS = "23456789TJQKA"
+
+# combo numbers of the 51 opponent hands holding each card (card removal)
+CARD_COMBOS = [[number for number, combo in enumerate(COMBOS) if card in combo] for card in range(52)]
+
+
+def rank_combos(high, low, suited=None):
+    """combo numbers of a starting hand given by its ranks (0-12)
+    pairs: the 6 suit combinations, otherwise suited (4), offsuit (12) or both (suited None)"""
+    combos = []
+    for suit_a in range(4):
+        for suit_b in range(4):
+            if high == low and suit_b <= suit_a:
+                continue
+            if high != low and suited is not None and (suit_a == suit_b) != suited:
+                continue
+            combos.append(combo_number(13 * suit_a + high, 13 * suit_b + low))
+    return combos
+
+
+def parse_rank(character, token):
+    if character.upper() not in RANK_CHARACTERS:
+        raise ValueError("Unknown rank in %r" % token)
+    return RANK_CHARACTERS.index(character.upper())
+
+
+def parse_hand_class(text, token):
+    """"AKs"/ "AKo"/ "AK"/ "TT" to (high rank, low rank, suited or None)"""
+    if len(text) not in (2, 3) or (len(text) == 3 and text[2] not in "so"):
+        raise ValueError("Unknown hand in %r" % token)
+    high, low = sorted((parse_rank(text[0], token), parse_rank(text[1], token)), reverse=True)
+    suited = {"s": True, "o": False}.get(text[2]) if len(text) == 3 else None
+    if high == low and suited is not None:
+        raise ValueError("Pairs can't be suited or offsuit: %r" % token)
+    return high, low, suited
+
+
+def parse_token(token):
+    """combo numbers of one range token:
+    "TT", "TT+" (TT up to AA), "TT-77", "AKs"/ "AKo"/ "AK", "AQs+" (AQs, AKs: the kicker goes up), "A5s-A2s",
+    or one exact hand like "AsKs" """
+    if len(token) == 4 and token[1].lower() in "cdhs" and token[3].lower() in "cdhs":
+        card_a, card_b = parse_card(token[:2]), parse_card(token[2:])
+        if card_a == card_b:
+            raise ValueError("Duplicate card in %r" % token)
+        return [combo_number(card_a, card_b)]
+
+    if token.endswith("+"):
+        high, low, suited = parse_hand_class(token[:-1], token)
+        if high == low:
+            return [combo for pair in range(low, 13) for combo in rank_combos(pair, pair)]
+        return [combo for kicker in range(low, high) for combo in rank_combos(high, kicker, suited)]
+
+    if "-" in token:
+        first, last = (parse_hand_class(part, token) for part in token.split("-", 1))
+        if first[0] == first[1] and last[0] == last[1]:  # pair range
+            bottom, top = sorted((first[0], last[0]))
+            return [combo for pair in range(bottom, top + 1) for combo in rank_combos(pair, pair)]
+        if first[0] != last[0] or first[2] != last[2] or first[0] in (first[1], last[1]):
+            raise ValueError("A range needs the same top card and suitedness: %r" % token)
+        bottom, top = sorted((first[1], last[1]))
+        return [combo for kicker in range(bottom, top + 1) for combo in rank_combos(first[0], kicker, first[2])]
+
+    return rank_combos(*parse_hand_class(token, token))
+
+
+class AliasTable:
+    """vose's alias method: samples combo numbers proportionally to their weights in O(1)
+    (one uniform slot, then a biased coin between the slot's combo and its alias)"""
+
+    def __init__(self, combos, weights):
+        count = len(combos)
+        if count == 0:
+            raise ValueError("Every hand of the range is blocked by the known cards")
+        total = sum(weights)
+        scaled = [weight * count / total for weight in weights]
+        self.combos = combos
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+        small = [slot for slot in range(count) if scaled[slot] < 1]
+        large = [slot for slot in range(count) if scaled[slot] >= 1]
+        while small and large:
+            slot, alias = small.pop(), large.pop()
+            self.probabilities[slot] = scaled[slot]
+            self.aliases[slot] = alias
+            scaled[alias] -= 1 - scaled[slot]
+            (small if scaled[alias] < 1 else large).append(alias)
+        # leftovers are 1 up to rounding error: they keep probability 1
+
+    def sample(self, random_float):
+        """combo number drawn with a single call of random_float (e.g. rng.random)"""
+        position = random_float() * len(self.combos)
+        slot = int(position)
+        if position - slot >= self.probabilities[slot]:  # the fraction of the first draw is the coin
+            slot = self.aliases[slot]
+        return self.combos[slot]
+
+
+class Range:
+    """weights of the 1326 opponent hands (not normalized, 0 = not in the range)
+    alias tables without the hands blocked by the known cards are built lazily, card removal is incremental:
+    a later street only removes the hands holding the new cards and rebuilds the table once"""
+
+    def __init__(self, weights=None):
+        self.weights = array("d", weights if weights is not None else [1.0] * len(COMBOS))
+        if len(self.weights) != len(COMBOS):
+            raise ValueError("Need one weight per hole card combo (%d)" % len(COMBOS))
+        self.known_mask = 0  # known cards of the cached alias table
+        self.live_weights = self.weights[:]  # weights with the blocked hands removed
+        self.table = None
+
+    @classmethod
+    def from_notation(cls, text):
+        """range from notation like "TT+, AQs+, KQo:0.5, A5s-A2s, AsKs" (":weight" sets that token's weight,
+        default 1, later tokens overwrite earlier ones)"""
+        weights = [0.0] * len(COMBOS)
+        for token in text.replace(";", ",").split(","):
+            token = token.strip()
+            if not token:
+                continue
+            token, _, weight = token.partition(":")
+            weight = float(weight) if weight else 1.0
+            if weight < 0:
+                raise ValueError("Negative weight in %r" % token)
+            for combo in parse_token(token.strip()):
+                weights[combo] = weight
+        return cls(weights)
+
+    def __len__(self):
+        """number of hands in the range"""
+        return sum(1 for weight in self.weights if weight > 0)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(known_mask=0, live_weights=self.weights[:], table=None)  # workers build their own table
+        return state
+
+    def alias(self, known_cards):
+        """AliasTable of the hands not blocked by known_cards (CardSet), rebuilt only when the known cards change"""
+        mask = known_cards.mask
+        if self.table is not None and mask == self.known_mask:
+            return self.table
+        if self.known_mask & ~mask:  # cards were taken back (new hand): start from the full range again
+            self.live_weights = self.weights[:]
+            self.known_mask = 0
+        new_cards = mask & ~self.known_mask
+        while new_cards:
+            lowest = new_cards & -new_cards
+            for combo in CARD_COMBOS[lowest.bit_length() - 1]:
+                self.live_weights[combo] = 0
+            new_cards ^= lowest
+        self.known_mask = mask
+        combos = [combo for combo, weight in enumerate(self.live_weights) if weight > 0]
+        self.table = AliasTable(combos, [self.live_weights[combo] for combo in combos])
+        return self.table
+
+    def sample(self, known_cards, rng=None):
+        """one opponent hand (pair of cards) drawn from the range without the known cards"""
+        return COMBOS[self.alias(known_cards).sample((rng or random).random)]
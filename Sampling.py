@@ -0,0 +1,155 @@
+import math
+from array import array
+from collections import Counter
+from itertools import combinations
+from Evaluator import PartialHand
+
+
+# how rollouts draw the opponent hand and the runout (PokerBot.sampling)
+# - balanced: OpponentBandit visits every opponent hand once per pass in a new random order, the runout is sampled
+#   uniformly (default): every hand gets the same share of rollouts, so the average of the per hand win rates is
+#   unbiased and no worse than plain uniform sampling
+# - ucb: OpponentBandit picks the opponent hand by UCB1, the runout is sampled uniformly
+#   (biased: UCB1 keeps revisiting the hands whose first rollouts won, so their low estimates are never corrected)
+# - uniform: opponent hand and runout both sampled uniformly, plain mean (the reference for variance reduction)
+# - stratified: passes over every (opponent hand, first runout card) stratum, see StratifiedDraws
+# - control: the stratified draws, regression adjusted on a control variate: the percentile of our own final hand
+#   strength over every runout, whose mean is known exactly (see strength_percentiles)
+SAMPLING_MODES = ("balanced", "ucb", "uniform", "stratified", "control")
+
+
+class StrataStats:
+    """count, sum and sum of squares of the rollout results in every stratum, worker stats merge by adding them
+    control: also the sum of a control variate, of its squares and of its products with the results"""
+
+    def __init__(self, size, control=False):
+        self.counts = array("d", bytes(8 * size))
+        self.sums = array("d", bytes(8 * size))
+        self.squares = array("d", bytes(8 * size))
+        self.controls = self.control_squares = self.products = None
+        if control:
+            self.controls = array("d", bytes(8 * size))
+            self.control_squares = array("d", bytes(8 * size))
+            self.products = array("d", bytes(8 * size))
+
+    def merge(self, other):
+        for stratum in range(len(self.counts)):
+            self.counts[stratum] += other.counts[stratum]
+            self.sums[stratum] += other.sums[stratum]
+            self.squares[stratum] += other.squares[stratum]
+            if self.controls is not None:
+                self.controls[stratum] += other.controls[stratum]
+                self.control_squares[stratum] += other.control_squares[stratum]
+                self.products[stratum] += other.products[stratum]
+
+    def simulations(self):
+        return int(sum(self.counts))
+
+    def slope(self):
+        """pooled within stratum regression slope of the results on the control variate (0 until it varies)"""
+        covariance = variation = 0
+        for stratum, count in enumerate(self.counts):
+            if count > 1:
+                control_mean = self.controls[stratum] / count
+                covariance += self.products[stratum] - control_mean * self.sums[stratum]
+                variation += self.control_squares[stratum] - control_mean * self.controls[stratum]
+        return covariance / variation if variation > 1e-12 else 0
+
+    def estimate(self, weights, control_mean=None):
+        """stratified estimate of the win rate: weighted mean of the visited strata's means (weights of unvisited
+        strata are left out and the rest renormalized)
+        control_mean: known mean of the control variate, the results are regression adjusted on it
+        (result - slope * (control - control_mean)), which removes the part of the variance the control explains
+        returns (win rate, standard error), strata with a single visit use the overall variance"""
+        simulations = sum(self.counts)
+        if simulations == 0:
+            return 0, 0.5
+        sums, squares = self.sums, self.squares
+        slope = self.slope() if control_mean is not None else 0
+        if slope != 0:
+            sums = [total - slope * (control - count * control_mean)
+                    for total, control, count in zip(self.sums, self.controls, self.counts)]
+            squares = [square - 2 * slope * (product - control_mean * total)
+                       + slope * slope * (control_square - 2 * control_mean * control + count * control_mean ** 2)
+                       for square, product, total, control_square, control, count in
+                       zip(self.squares, self.products, self.sums, self.control_squares, self.controls, self.counts)]
+        overall = sum(sums) / simulations
+        overall_variance = max(sum(squares) / simulations - overall * overall, 0)
+
+        total_weight = mean = variance = 0
+        for stratum, weight in enumerate(weights):
+            count = self.counts[stratum]
+            if count == 0 or weight == 0:
+                continue
+            stratum_mean = sums[stratum] / count
+            if count > 1:
+                stratum_variance = max(squares[stratum] - count * stratum_mean * stratum_mean, 0) / (count - 1)
+            else:
+                stratum_variance = overall_variance
+            total_weight += weight
+            mean += weight * stratum_mean
+            variance += weight * weight * stratum_variance / count
+        return mean / total_weight, math.sqrt(variance) / total_weight
+
+
+def normal_interval(win_rate, standard_error, z):
+    """win rate +- z standard errors, clipped to [0, 1]"""
+    return max(0.0, win_rate - z * standard_error), min(1.0, win_rate + z * standard_error)
+
+
+class StratifiedDraws:
+    """latin square passes over the (opponent hand, first runout card) strata
+    every pass visits each opponent hand once in a fixed random order, the i-th hand of the order gets the
+    (i + pass + shift)-th card of one shuffled order of the cards left (skipping its own cards) as first runout card
+    - every pass balances the opponent hands and spreads the first cards evenly over them
+    - every len(cards left) passes cover each stratum exactly once
+    - the random shift keeps every single draw uniform"""
+
+    def __init__(self, arms, combos, remaining_cards, to_reveal, rng):
+        self.order = arms[:]
+        rng.shuffle(self.order)
+        self.first_cards = {}  # combo number -> shuffled cards left without the opponent hand
+        if to_reveal > 0:
+            cards_left = remaining_cards[:]
+            rng.shuffle(cards_left)
+            for combo_number in arms:
+                card_a, card_b = combos[combo_number]
+                self.first_cards[combo_number] = [card for card in cards_left if card != card_a and card != card_b]
+        self.shift = rng.randrange(len(remaining_cards))
+        self.position = 0
+        self.pass_number = 0
+
+    def next(self):
+        """(combo number, first runout card or None on the river) of the next draw"""
+        position = self.position
+        combo_number = self.order[position]
+        self.position += 1
+        pass_number = self.pass_number
+        if self.position == len(self.order):
+            self.position = 0
+            self.pass_number += 1
+        cards = self.first_cards.get(combo_number)
+        return combo_number, cards[(position + pass_number + self.shift) % len(cards)] if cards else None
+
+
+def strength_percentiles(my_hand, revealed_cards, budget=100000):
+    """percentile of each of our possible final hand strengths over every runout, enumerated exactly: the share of
+    runouts giving a weaker hand plus half the share giving the same strength
+    a rollout's percentile is a control variate whose mean is exactly 1/2 (runouts are uniform), it explains how
+    much of the result comes from how strong our own hand ends up
+    returns {strength: percentile}, or None when the runouts exceed the budget"""
+    known_cards = set(my_hand + revealed_cards)
+    remaining_cards = [card for card in range(52) if card not in known_cards]
+    to_reveal = 5 - len(revealed_cards)
+    if math.comb(len(remaining_cards), to_reveal) > budget:
+        return None
+
+    my_partial = PartialHand(my_hand + revealed_cards)
+    counts = Counter(my_partial.strength(runout) for runout in combinations(remaining_cards, to_reveal))
+    runouts = sum(counts.values())
+    percentiles = {}
+    weaker = 0
+    for strength in sorted(counts):
+        percentiles[strength] = (weaker + counts[strength] / 2) / runouts
+        weaker += counts[strength]
+    return percentiles
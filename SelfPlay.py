@@ -0,0 +1,231 @@
+import os
+import sys
+import math
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+from statistics import NormalDist
+from Evaluator import hand_strength
+from PokerBot import PokerBot, random_setup, wilson_interval
+from PreflopTable import preflop_equity
+
+
+# headless heads up self-play between two policies, no prompts and no prints in the game loop
+# every hand: both players ante 1, then before the flop, turn and river each player decides stay (pays 1 more) or
+# fold at the same time
+# - one player folds: the other one takes the pot, the folder loses what they put in
+# - both fold: the hand is void (both get their chips back)
+# - both stay to the end: showdown, the better hand takes the pot (ties split it)
+# with duplicate deals every deal is played twice with the hole cards swapped, so card luck cancels out
+ANTE = 1
+CALL = 1
+DECISION_STREETS = (0, 3, 4)  # revealed cards at each decision: preflop, flop, turn
+
+
+class AlwaysStay:
+    """never folds"""
+
+    def decide(self, my_hand, revealed_cards, num_opponents=1):
+        return "stay"
+
+
+class RandomPolicy:
+    """stays with a fixed probability"""
+
+    def __init__(self, stay_probability=0.5, rng=None):
+        self.stay_probability = stay_probability
+        self.rng = rng if rng is not None else random.Random()
+
+    def decide(self, my_hand, revealed_cards, num_opponents=1):
+        return "stay" if self.rng.random() < self.stay_probability else "fold"
+
+
+class EquityTablePolicy:
+    """stays while the preflop table equity of its hole cards reaches the threshold, ignores the board"""
+
+    def __init__(self, threshold=0.5):
+        self.threshold = threshold
+
+    def decide(self, my_hand, revealed_cards, num_opponents=1):
+        return "stay" if preflop_equity(my_hand) >= self.threshold else "fold"
+
+
+class MCTSPolicy:
+    """the bot with a small rollout budget per decision (exact enumeration only on the river)
+    every decision gets its own seed from the policy's random stream, so a match is reproducible"""
+
+    def __init__(self, simulations=200, rng=None):
+        self.bot = PokerBot()
+        self.bot.simulation_time_limit = None
+        self.bot.simulation_limit = simulations
+        self.bot.min_simulations = min(self.bot.min_simulations, simulations)
+        self.bot.enumeration_budget = 1000  # river only (990 outcomes), the turn (45540) is too slow for self-play
+        self.rng = rng if rng is not None else random.Random()
+
+    def decide(self, my_hand, revealed_cards, num_opponents=1):
+        self.bot.seed = self.rng.getrandbits(64)
+        return self.bot.decide(my_hand, revealed_cards, num_opponents)
+
+
+POLICIES = {"stay": AlwaysStay, "random": RandomPolicy, "table": EquityTablePolicy, "mcts": MCTSPolicy}
+
+
+def make_policy(spec, rng):
+    """policy from a spec like "mcts:200" (rollouts), "table:0.55" (threshold), "random:0.7" or "stay" """
+    name, _, argument = spec.partition(":")
+    if name not in POLICIES:
+        raise ValueError("Unknown policy %r (choose from %s)" % (name, ", ".join(sorted(POLICIES))))
+    if name == "stay":
+        return AlwaysStay()
+    if name == "table":
+        return EquityTablePolicy(float(argument)) if argument else EquityTablePolicy()
+    if name == "random":
+        return RandomPolicy(float(argument) if argument else 0.5, rng)
+    return MCTSPolicy(int(argument) if argument else 200, rng)
+
+
+def play_hand(policy_a, policy_b, hole_a, hole_b, board):
+    """plays one hand, returns (player a's net chips, outcome)
+    outcome: "win"/ "loss"/ "tie" at showdown, "a_fold"/ "b_fold"/ "both_fold" when someone folded"""
+    put_in = ANTE  # chips each player has in the pot
+    for revealed in DECISION_STREETS:
+        a_stays = policy_a.decide(hole_a, board[:revealed]) == "stay"
+        b_stays = policy_b.decide(hole_b, board[:revealed]) == "stay"
+        if not a_stays and not b_stays:
+            return 0, "both_fold"
+        if not a_stays:
+            return -put_in, "a_fold"
+        if not b_stays:
+            return put_in, "b_fold"
+        put_in += CALL
+
+    strength_a, strength_b = hand_strength(hole_a + board), hand_strength(hole_b + board)
+    if strength_a > strength_b:
+        return put_in, "win"
+    if strength_a < strength_b:
+        return -put_in, "loss"
+    return 0, "tie"
+
+
+class MatchStats:
+    """aggregated results of player a against player b, merged across workers by adding"""
+
+    OUTCOMES = ("win", "loss", "tie", "a_fold", "b_fold", "both_fold")
+
+    def __init__(self):
+        self.hands = 0
+        self.outcomes = dict.fromkeys(self.OUTCOMES, 0)
+        self.chips = 0  # player a's net chips
+        self.chip_squares = 0
+        self.seconds = 0.0  # cpu seconds spent playing (summed over workers)
+
+    def add(self, chips, outcome):
+        self.hands += 1
+        self.outcomes[outcome] += 1
+        self.chips += chips
+        self.chip_squares += chips * chips
+
+    def merge(self, other):
+        self.hands += other.hands
+        for outcome in self.OUTCOMES:
+            self.outcomes[outcome] += other.outcomes[outcome]
+        self.chips += other.chips
+        self.chip_squares += other.chip_squares
+        self.seconds += other.seconds
+
+    def score(self):
+        """player a's share of the decided hands: wins and opponent folds count 1, ties 0.5 (void hands left out)"""
+        decided = self.hands - self.outcomes["both_fold"]
+        wins = self.outcomes["win"] + self.outcomes["b_fold"] + self.outcomes["tie"] / 2
+        return wins, decided
+
+    def chips_per_hand(self, z):
+        """(mean net chips of player a per hand, half width of its normal confidence interval)"""
+        if self.hands == 0:
+            return 0, math.inf
+        mean = self.chips / self.hands
+        variance = max(self.chip_squares / self.hands - mean * mean, 0)
+        return mean, z * math.sqrt(variance / self.hands)
+
+    def summary(self, name_a, name_b, confidence=0.95, elapsed=None):
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        wins, decided = self.score()
+        lower, upper = wilson_interval(wins, decided, z)
+        chips, spread = self.chips_per_hand(z)
+        fractions = ", ".join("%s %.3f" % (outcome, self.outcomes[outcome] / max(self.hands, 1)) for outcome in self.OUTCOMES)
+        text = "%s vs %s: %d hands, score %.4f [%.4f, %.4f], chips/hand %+.4f +- %.4f (%s)" % (
+            name_a, name_b, self.hands, wins / decided if decided else 0, lower, upper, chips, spread, fractions)
+        if elapsed:
+            text += ", %.0f hands/s" % (self.hands / elapsed)
+        return text
+
+
+def play_chunk(spec_a, spec_b, hands, seed, duplicate=True):
+    """plays `hands` hands (deals, times 2 with duplicate) with its own random streams, returns MatchStats"""
+    start = time.process_time()
+    rng = random.Random(seed)
+    policy_a = make_policy(spec_a, random.Random(rng.getrandbits(64)))
+    policy_b = make_policy(spec_b, random.Random(rng.getrandbits(64)))
+    stats = MatchStats()
+    for _ in range(hands):
+        hole_a, board, hole_b = random_setup(rng)
+        stats.add(*play_hand(policy_a, policy_b, hole_a, hole_b, board))
+        if duplicate:
+            stats.add(*play_hand(policy_a, policy_b, hole_b, hole_a, board))
+    stats.seconds = time.process_time() - start
+    return stats
+
+
+def run_match(spec_a, spec_b, hands, workers=1, seed=None, chunk=1000, duplicate=True):
+    """plays `hands` deals in chunks over `workers` processes
+    yields the aggregated MatchStats after every finished chunk (the last one holds every hand)"""
+    seed_stream = random.Random(seed)
+    chunks = [min(chunk, hands - start) for start in range(0, hands, chunk)]
+    seeds = [seed_stream.getrandbits(64) for _ in chunks]
+    total = MatchStats()
+    if workers <= 1:
+        for size, chunk_seed in zip(chunks, seeds):
+            total.merge(play_chunk(spec_a, spec_b, size, chunk_seed, duplicate))
+            yield total
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_chunk, spec_a, spec_b, size, chunk_seed, duplicate)
+                   for size, chunk_seed in zip(chunks, seeds)]
+        for future in as_completed(futures):
+            total.merge(future.result())
+            yield total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="headless heads up self-play between bot policies")
+    parser.add_argument("policies", nargs="+", help="2 or more of: stay, random[:p], table[:threshold], mcts[:rollouts]"
+                                                    " (every pair plays a match)")
+    parser.add_argument("--hands", type=int, default=100000, help="deals per match")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=1000, help="deals per work unit")
+    parser.add_argument("--no-duplicate", action="store_true", help="play every deal once instead of twice")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+    if len(args.policies) < 2:
+        parser.error("need at least 2 policies")
+    for spec in args.policies:
+        make_policy(spec, random.Random())  # reject bad specs before starting the workers
+
+    for spec_a, spec_b in combinations(args.policies, 2):
+        start = last_report = time.time()
+        stats = MatchStats()
+        for stats in run_match(spec_a, spec_b, args.hands, args.workers, args.seed, args.chunk, not args.no_duplicate):
+            if time.time() - last_report >= args.report_every:
+                last_report = time.time()
+                print("...", stats.summary(spec_a, spec_b, args.confidence, time.time() - start), flush=True)
+        print(stats.summary(spec_a, spec_b, args.confidence, time.time() - start), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import io
+import json
+import unittest
+from unittest import mock
+from BatchEquity import score_stream, main
+
+
+SCENARIOS = [
+    {"id": "preflop", "hole": ["As", "Ah"]},
+    {"id": "flop", "hole": ["A♠", "K♠"], "board": ["Q♠", "J♠", "3♣"], "opponents": 2, "simulations": 2000},
+    {"id": "river", "hole": [51, 50], "board": [49, 48, 47, 1, 2]},
+    {"id": "bad", "hole": ["As", "As"]},
+]
+
+
+def scenario_lines():
+    return [json.dumps(scenario) for scenario in SCENARIOS]
+
+
+class TestBatchEquity(unittest.TestCase):
+
+    def test_scores_in_order(self):
+        results = [json.loads(line) for line in score_stream(scenario_lines(), simulations=2000, seed=480)]
+        self.assertEqual([result["id"] for result in results], ["preflop", "flop", "river", "bad"])
+        self.assertEqual(results[0]["decision"], "stay")
+        self.assertEqual((results[1]["method"], results[1]["decision"]), ("mcts", "stay"))
+        self.assertEqual((results[2]["method"], results[2]["equity"]), ("exact", 1.0))
+        self.assertIn("Duplicate cards", results[3]["error"])
+
+    def test_process_pool_matches_single_process(self):
+        single = list(score_stream(scenario_lines(), workers=1, simulations=2000, seed=480))
+        pooled = list(score_stream(scenario_lines(), workers=2, simulations=2000, seed=480, window=2))
+        self.assertEqual(single, pooled)
+
+    def test_skips_blank_lines_and_reports_bad_json(self):
+        results = [json.loads(line) for line in score_stream(["", "not json\n", scenario_lines()[0]], simulations=100)]
+        self.assertEqual([result["line"] for result in results], [2, 3])
+        self.assertIn("error", results[0])
+
+    def test_reports_scenarios_that_are_not_objects(self):
+        lines = ["[1, 2]", '"As Ks"', "null", scenario_lines()[0]]
+        results = [json.loads(line) for line in score_stream(lines, simulations=100)]
+        self.assertEqual([result["line"] for result in results], [1, 2, 3, 4])
+        for result in results[:3]:
+            self.assertIn("must be a JSON object", result["error"])
+        self.assertEqual(results[3]["id"], "preflop")
+
+    def test_needs_a_budget(self):
+        line = json.dumps({"id": "open", "hole": ["As", "Ks"], "board": ["Qs", "Js", "2h"], "simulations": None})
+        result = json.loads(next(score_stream([line], simulations=100)))
+        self.assertIn("Need a rollout budget", result["error"])
+        line = json.dumps({"id": "timed", "hole": ["As", "Ks"], "board": ["Qs", "Js", "2h"], "opponents": 2,
+                           "simulations": None, "time_limit": 0.05})
+        self.assertEqual(json.loads(next(score_stream([line], simulations=100)))["method"], "mcts")
+
+    def test_reports_impossible_opponent_counts(self):
+        lines = [json.dumps({"id": opponents, "hole": ["As", "Ks"], "opponents": opponents})
+                 for opponents in (23, 0, "2", 1.5)]
+        results = [json.loads(line) for line in score_stream(lines + scenario_lines()[:1], simulations=100)]
+        for result in results[:4]:
+            self.assertIn("opponents", result["error"])
+        self.assertEqual(results[4]["id"], "preflop")
+
+    def test_cli(self):
+        sink = io.StringIO()
+        with mock.patch("sys.stdin", io.StringIO(scenario_lines()[0])), mock.patch("sys.stdout", sink):
+            self.assertEqual(main(["--workers", "1"]), 0)
+        self.assertEqual(json.loads(sink.getvalue())["id"], "preflop")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import random
+import unittest
+from Evaluator import evaluate_hand
+from Benchmark import CATEGORY_NAMES, category_hands, compare, outcome_variance, result
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_category_hands(self):
+        rng = random.Random(480)
+        for category in range(len(CATEGORY_NAMES)):
+            for hand in category_hands(category, 3, rng):
+                self.assertEqual(len(set(hand)), 7)
+                self.assertEqual(evaluate_hand(hand)[0], category)
+
+    def test_compare_throughput(self):
+        baseline = {"rollouts": result(1000, "rollouts/s")}
+        self.assertEqual(compare({"rollouts": result(800, "rollouts/s")}, baseline, 0.3, 0.01), [])
+        self.assertEqual(len(compare({"rollouts": result(600, "rollouts/s")}, baseline, 0.3, 0.01)), 1)
+
+    def test_compare_errors(self):
+        baseline = {"error": result(0.002, "abs error", higher_is_better=False)}
+        self.assertEqual(compare({"error": result(0.011, "abs error", False)}, baseline, 0.3, 0.01), [])  # within slack
+        self.assertEqual(len(compare({"error": result(0.05, "abs error", False)}, baseline, 0.3, 0.01)), 1)
+
+    def test_outcome_variance(self):
+        self.assertEqual(outcome_variance([51, 50], [49, 48, 47, 1, 2]), 0)  # royal flush always wins
+        self.assertAlmostEqual(outcome_variance([0, 13], [51, 50, 49, 48, 47]), 0)  # royal flush on board: always a tie
+        self.assertGreater(outcome_variance([51, 50], [49, 48, 1, 2]), 0)
+
+    def test_compare_missing(self):
+        self.assertEqual(len(compare({}, {"rollouts": result(1000, "rollouts/s")}, 0.3, 0.01)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import unittest
+from Deck import parse_hand
+from DecisionService import DecisionService, generate_load, percentile
+from PokerBot import PokerBot
+from Ranges import Range
+from TestPokerBot import budget_bot
+
+
+class TestDecisionService(unittest.TestCase):
+
+    def run_service(self, scenario, bot=None, workers=1):
+        async def run():
+            service = DecisionService(bot if bot is not None else budget_bot(None, 10), workers, seed=480).open()
+            try:
+                return await scenario(service)
+            finally:
+                service.close()
+        return asyncio.run(run())
+
+    def test_answers_by_deadline(self):
+        async def scenario(service):
+            return await service.decide(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h"]), deadline=0.2)
+        report = self.run_service(scenario)
+        self.assertEqual(report.method, "mcts")
+        self.assertGreater(report.simulations, 0)
+        self.assertLess(report.elapsed, 0.3)
+        self.assertGreater(report.win_rate, 0.6)
+
+    def test_table_exact_and_budget(self):
+        async def scenario(service):
+            reports = await asyncio.gather(
+                service.decide(parse_hand(["As", "Ah"]), []),
+                service.decide(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h", "3c", "4d"]), deadline=10),
+                service.decide(parse_hand(["7c", "2d"]), parse_hand(["Qs", "Js", "2h"]), 2, deadline=10,
+                               max_simulations=3000))
+            return reports, service.stats()
+        (table, exact, budget), stats = self.run_service(scenario)
+        self.assertEqual(table.method, "preflop_table")
+        self.assertEqual((exact.method, exact.win_rate),
+                         ("exact", PokerBot().exact_win_rate(parse_hand(["As", "Ks"]),
+                                                             parse_hand(["Qs", "Js", "2h", "3c", "4d"]))[0]))
+        self.assertEqual((budget.method, budget.simulations), ("mcts", 3000))
+        self.assertEqual((stats["table"], stats["exact"], stats["budget"]), (1, 1, 1))
+
+    def test_earliest_deadline_first(self):
+        # one worker: the urgent request gets every slice until its deadline although it arrived later
+        # (counted in slices rather than compared in rollouts, which depend on the machine's load)
+        async def scenario(service):
+            jobs = []
+            queue = service._queue
+
+            def record(job):
+                jobs.append(job)
+                queue(job)
+            service._queue = record
+            relaxed = asyncio.create_task(service.decide(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h"]),
+                                                         deadline=0.8))
+            await asyncio.sleep(0)
+            urgent = await service.decide(parse_hand(["7c", "2d"]), parse_hand(["Qs", "Js", "2h"]), deadline=0.4)
+            relaxed_so_far = jobs[0].simulations
+            return urgent, relaxed_so_far, await relaxed, service.slice_simulations
+        urgent, relaxed_so_far, relaxed, slice_simulations = self.run_service(scenario)
+        self.assertGreater(urgent.simulations, 4 * slice_simulations)
+        self.assertLessEqual(relaxed_so_far, 2 * slice_simulations)  # its first slice, at most one more at the end
+        self.assertGreater(relaxed.simulations, relaxed_so_far)
+
+    def test_settled_decision_answers_early(self):
+        async def scenario(service):
+            return await service.decide(parse_hand(["As", "Ah"]), parse_hand(["Ac", "Ad", "2h"]), 2, deadline=10)
+        report = self.run_service(scenario, bot=PokerBot())
+        self.assertEqual(report.decision, "stay")
+        self.assertLess(report.elapsed, 5)
+
+    def test_prior_uses_the_board(self):
+        # the deadline hits before any slice finishes: a few rollouts in place see the full house (72o folds preflop)
+        bot = budget_bot(None, 10)
+        bot.use_preflop_table = False
+
+        async def scenario(service):
+            return await asyncio.gather(
+                service.decide(parse_hand(["7c", "2d"]), parse_hand(["7h", "7s", "2h"]), deadline=0),
+                service.decide(parse_hand(["7c", "2d"]), [], deadline=0))
+        board, preflop = self.run_service(scenario, bot=bot)
+        self.assertEqual((board.method, board.decision), ("prior", "stay"))
+        self.assertTrue(0 < board.simulations <= 100)  # prior_simulations, cut short by the margin under load
+        self.assertGreater(board.win_rate, 0.9)
+        self.assertEqual((preflop.method, preflop.decision), ("prior", "fold"))
+
+    def test_every_request_is_answered(self):
+        def broken_hook(report):
+            raise RuntimeError("hook failed")
+        bot = budget_bot(None, 10)
+        bot.telemetry = broken_hook
+
+        async def scenario(service):
+            lines = await asyncio.gather(
+                service.answer('{"id": "table", "hole": ["As", "Ah"]}'),
+                service.answer('{"id": "deadline", "hole": ["As", "Ks"], "board": ["Qs", "Js", "2h"], "deadline_ms": 50}'),
+                service.answer('{"id": "budget", "hole": ["As", "Ks"], "board": ["Qs", "Js", "2h"], "simulations": 500}'))
+            return [json.loads(line) for line in lines], service.stats()
+        responses, stats = self.run_service(scenario, bot=bot)
+        self.assertEqual([response["id"] for response in responses], ["table", "deadline", "budget"])
+        for response in responses:
+            self.assertEqual(response["error"], "RuntimeError: hook failed")
+        self.assertEqual(stats["error"], 3)
+        self.assertEqual(stats["answered"], 3)
+
+    def test_server_and_load_generator(self):
+        async def scenario(service):
+            server = await service.start_server(port=0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                results = await generate_load(port=port, requests=20, concurrency=4, deadline_ms=100, seed=480)
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b'{"id": "bad", "hole": ["As", "As"]}\n')
+                await writer.drain()
+                error = json.loads(await reader.readline())
+                writer.close()
+                await writer.wait_closed()
+            finally:
+                server.close()
+                await server.wait_closed()
+            return results, error
+        results, error = self.run_service(scenario)
+        self.assertEqual((results["requests"], results["errors"]), (20, 0))
+        self.assertLessEqual(results["p50_ms"], results["p95_ms"])
+        self.assertLessEqual(results["p95_ms"], results["p99_ms"])
+        self.assertEqual(error["id"], "bad")
+        self.assertIn("Duplicate cards", error["error"])
+
+    def test_impossible_opponent_count(self):
+        async def scenario(service):
+            response = await asyncio.wait_for(service.answer(
+                '{"id": 1, "hole": ["As", "Ks"], "opponents": 23, "deadline_ms": 200}'), 5)
+            with self.assertRaises(ValueError):
+                await service.decide(parse_hand(["As", "Ks"]), [], 9)
+            return json.loads(response)
+        response = self.run_service(scenario)
+        self.assertEqual(response["id"], 1)
+        self.assertIn("opponents", response["error"])
+
+    def test_balanced_or_ucb_only(self):
+        bot = budget_bot(None, 10)
+        bot.sampling = "control"
+        with self.assertRaises(AssertionError):
+            DecisionService(bot)
+
+    def test_no_opponent_ranges(self):
+        bot = budget_bot(None, 10)
+        bot.opponent_range = Range.from_notation("QQ+, AK")
+        with self.assertRaises(AssertionError):
+            DecisionService(bot)
+
+    def test_percentile(self):
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([5], 99), 5)
+        self.assertEqual(percentile([], 50), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
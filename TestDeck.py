@@ -1,5 +1,6 @@
 import unittest
-from Deck import Deck, show_card, show_hand
+import random
+from Deck import COMBO_SETS, COMBOS, CardSet, Deck, combo_number, parse_card, parse_hand, show_card, show_hand
 
 class TestDeck(unittest.TestCase):
 
@@ -39,6 +40,30 @@ class TestDeck(unittest.TestCase):
         self.assertTrue(all(card in deck.cards for card in sample))
         self.assertEqual(len(deck.cards), 52)  # sampling shouldn't remove
 
+    def test_sample_exclude(self):
+        deck = Deck(random.Random(480))
+        deck.remove_cards(range(44))  # 8 cards left
+        excluded = CardSet([44, 45])
+        for _ in range(100):
+            sample = deck.sample(6, excluded)
+            self.assertEqual(sorted(sample), list(range(46, 52)))
+        self.assertEqual(sorted(deck.cards), list(range(44, 52)))  # sampling reorders but never removes
+
+    def test_sample_uniform(self):
+        deck = Deck(random.Random(480))
+        deck.remove_cards(range(48))  # 4 cards left
+        counts = {card: 0 for card in deck.cards}
+        for _ in range(4000):
+            for card in deck.sample(2, CardSet([48])):
+                counts[card] += 1
+        self.assertEqual(counts[48], 0)
+        for card in (49, 50, 51):
+            self.assertAlmostEqual(counts[card] / 8000, 1 / 3, delta=0.03)
+
+    def test_sample_too_large(self):
+        with self.assertRaises(ValueError):
+            Deck().sample(53)
+
     def test_show_card(self):
         # 0 = 2♣, 12 = A♣, 13 = 2♦, 51 = A♠
         self.assertEqual(show_card(0), "2♣")
@@ -46,11 +71,69 @@ class TestDeck(unittest.TestCase):
         self.assertEqual(show_card(13), "2♦")
         self.assertEqual(show_card(51), "A♠")
 
+    def test_parse_card(self):
+        self.assertEqual(parse_card("A♠"), 51)
+        self.assertEqual(parse_card("as"), 51)
+        self.assertEqual(parse_card("Td"), 21)
+        self.assertEqual(parse_card(7), 7)
+        self.assertEqual(parse_hand(show_hand(range(52))), list(range(52)))
+        for bad in ("1s", "Ax", "A", 52):
+            with self.assertRaises(ValueError):
+                parse_card(bad)
+
     def test_show_hand(self):
         hand = [0, 12, 25, 38, 51]  # 2♣, A♣, A♦, A♥, A♠
         expected = ["2♣", "A♣", "A♦", "A♥", "A♠"]
         self.assertEqual(show_hand(hand), expected)
 
 
+class TestCardSet(unittest.TestCase):
+
+    def test_membership(self):
+        cards = CardSet([0, 12, 51])
+        self.assertIn(51, cards)
+        self.assertNotIn(13, cards)
+        self.assertEqual(len(cards), 3)
+        self.assertEqual(list(cards), [0, 12, 51])
+
+    def test_update_and_union(self):
+        cards = CardSet([1])
+        cards.add(2)
+        cards.update([3, 4])
+        self.assertEqual(cards, CardSet([1, 2, 3, 4]))
+        self.assertEqual(cards | CardSet([5]), CardSet(range(1, 6)))
+        self.assertTrue(cards.isdisjoint(CardSet([5, 6])))
+        self.assertFalse(cards.isdisjoint(CardSet([4])))
+
+    def test_complement(self):
+        cards = CardSet(range(5))
+        self.assertEqual(list(cards.complement()), list(range(5, 52)))
+        self.assertEqual(len(CardSet().complement()), 52)
+
+    def test_deck_tracks_removed(self):
+        deck = Deck()
+        drawn = deck.draw(2)
+        deck.remove_cards([card for card in range(52) if card not in drawn][:3])
+        self.assertEqual(len(deck.removed), 5)
+        self.assertEqual(len(deck.cards), 47)
+        self.assertTrue(all(card not in deck.removed for card in deck.cards))
+
+
+    def test_sample_counts_excluded_cards(self):
+        deck = Deck(random.Random(480))
+        deck.remove_cards(range(48))  # 48, 49, 50, 51 left
+        self.assertEqual(sorted(deck.sample(2, CardSet([48, 49]))), [50, 51])
+        self.assertEqual(len(deck.sample(2, CardSet([0, 1, 48]))), 2)  # removed cards don't count
+        with self.assertRaises(ValueError):
+            deck.sample(3, CardSet([48, 49]))
+
+    def test_combo_numbers(self):
+        self.assertEqual(len(COMBOS), 1326)
+        for number, (card_a, card_b) in enumerate(COMBOS):
+            self.assertEqual(combo_number(card_a, card_b), number)
+            self.assertEqual(combo_number(card_b, card_a), number)
+            self.assertEqual(COMBO_SETS[number], CardSet([card_a, card_b]))
+
+
 if __name__ == "__main__":
     unittest.main()
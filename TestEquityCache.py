@@ -0,0 +1,135 @@
+import os
+import pickle
+import random
+import tempfile
+import unittest
+from itertools import permutations
+from Deck import parse_hand
+from EquityCache import EquityCache, canonical_hand, canonical_key
+from PokerBot import PokerBot
+
+
+def relabel(cards, suit_permutation):
+    return [13 * suit_permutation[card // 13] + card % 13 for card in cards]
+
+
+class TestCanonicalKey(unittest.TestCase):
+
+    def test_isomorphic_hands_share_a_key(self):
+        self.assertEqual(canonical_key(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h"])),
+                         canonical_key(parse_hand(["Ah", "Kh"]), parse_hand(["Qh", "Jh", "2d"])))
+
+    def test_different_hands_differ(self):
+        flush_draw = canonical_key(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h"]))
+        self.assertNotEqual(flush_draw, canonical_key(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2s"])))
+        self.assertNotEqual(flush_draw, canonical_key(parse_hand(["As", "Kh"]), parse_hand(["Qs", "Js", "2h"])))
+        self.assertNotEqual(flush_draw, canonical_key(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h"]), 2))
+
+    def test_every_relabelling(self):
+        rng = random.Random(480)
+        for _ in range(200):
+            cards = rng.sample(range(52), 7)
+            hole, board = cards[:2], cards[2:2 + rng.choice([0, 3, 4, 5])]
+            key, canonical = canonical_key(hole, board), canonical_hand(hole, board)
+            for suit_permutation in permutations(range(4)):
+                relabelled = relabel(hole, suit_permutation), relabel(board, suit_permutation)
+                self.assertEqual(canonical_key(*relabelled), key)
+                self.assertEqual(canonical_hand(*relabelled), canonical)
+
+    def test_order_does_not_matter(self):
+        self.assertEqual(canonical_key([51, 50], [1, 2, 3]), canonical_key([50, 51], [3, 1, 2]))
+
+
+class TestEquityCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = EquityCache(capacity=2)
+        cache.put("a", 0.1, "mcts", 10)
+        cache.put("b", 0.2, "mcts", 10)
+        cache.get("a")  # b is now least recently used
+        cache.put("c", 0.3, "mcts", 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), (0.1, "mcts", 10))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_sqlite_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "equity.sqlite")
+            cache = EquityCache(path)
+            cache.put("a", 0.25, "exact", 990)
+            cache.close()
+            cache = EquityCache(path)
+            self.assertEqual(cache.get("a"), (0.25, "exact", 990))
+            self.assertEqual(cache.get("a"), (0.25, "exact", 990))
+            self.assertEqual((cache.disk_hits, cache.memory_hits, cache.misses), (1, 1, 0))
+            cache.close()
+
+    def test_hit_rate(self):
+        cache = EquityCache()
+        self.assertEqual(cache.hit_rate(), 0)
+        cache.get("a")
+        cache.put("a", 0.5, "mcts", 1)
+        cache.get("a")
+        self.assertEqual(cache.hit_rate(), 0.5)
+
+
+class TestBotCache(unittest.TestCase):
+
+    def test_isomorphic_decision_hits_cache(self):
+        bot = PokerBot()
+        bot.cache = EquityCache()
+        bot.decide(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h", "3c"]))
+        first = bot.last_report
+        bot.decide(parse_hand(["Ad", "Kd"]), parse_hand(["Qd", "Jd", "2s", "3c"]))
+        second = bot.last_report
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual((second.method, second.win_rate), ("exact", first.win_rate))
+        self.assertEqual(bot.cache.stats()["memory_hits"], 1)
+
+    def test_reuses_rollouts_only_within_the_estimator_settings(self):
+        bot = PokerBot()
+        bot.seed, bot.confidence, bot.use_flop_index = 480, None, False
+        bot.simulation_limit, bot.simulation_time_limit = 500, None
+        bot.cache = EquityCache()
+        hand, board = parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h"])
+        bot.decide(hand, board)
+        self.assertEqual(bot.last_report.simulations, 500)
+
+        bot.simulation_limit = 2000  # a bigger budget than the cached estimate
+        bot.decide(hand, board)
+        self.assertFalse(bot.last_report.cached)
+        self.assertEqual(bot.last_report.simulations, 2000)
+        bot.simulation_limit = 1000  # the 2000 rollout estimate is good enough now
+        bot.decide(hand, board)
+        self.assertTrue(bot.last_report.cached)
+        self.assertEqual(bot.last_report.simulations, 2000)
+
+        bot.sampling = "ucb"  # another estimator never shares entries
+        bot.decide(hand, board)
+        self.assertFalse(bot.last_report.cached)
+        self.assertEqual(bot.cache.stats()["entries"], 2)
+
+    def test_reuses_settled_rollouts_with_a_time_budget(self):
+        bot = PokerBot()
+        bot.seed, bot.use_flop_index = 480, False
+        bot.simulation_limit, bot.simulation_time_limit = 2000, None
+        bot.cache = EquityCache()
+        hand, board = parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h"])
+        bot.decide(hand, board)  # far above the threshold, settled early
+        bot.simulation_limit, bot.simulation_time_limit = None, 1
+        bot.decide(hand, board)
+        self.assertTrue(bot.last_report.cached)
+
+    def test_bot_pickles_without_cache_and_hooks(self):
+        bot = PokerBot()
+        bot.cache = EquityCache()
+        bot.telemetry = lambda report: None
+        copy = pickle.loads(pickle.dumps(bot))
+        self.assertIsNone(copy.cache)
+        self.assertIsNone(copy.telemetry)
+        self.assertEqual(copy.simulation_time_limit, bot.simulation_time_limit)
+
+
+if __name__ == "__main__":
+    unittest.main()
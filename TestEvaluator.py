@@ -1,5 +1,9 @@
+import os
+import random
+import tempfile
 import unittest
-from Evaluator import evaluate_hand, rank, suit
+from Evaluator import (PartialHand, evaluate_hand, evaluate_hands_batch, classify_hand, hand_strength, decode_strength,
+                       build_tables, write_tables, map_tables, rank, suit, np)
 
 
 def hand_from_strs(card_strs):
@@ -57,5 +61,81 @@ class TestEvaluator(unittest.TestCase):
         self.assertEqual(evaluate_hand(hand), (0, [10, 9, 7, 6, 3]))  # Queens, Jacks, 9, 8, 5
 
 
+class TestHandStrength(unittest.TestCase):
+
+    def test_matches_reference_evaluator(self):
+        rng = random.Random(480)
+        for _ in range(2000):
+            hand = rng.sample(range(52), 7)
+            self.assertEqual(evaluate_hand(hand), classify_hand(hand))
+
+    def test_strength_orders_like_reference(self):
+        rng = random.Random(481)
+        for _ in range(2000):
+            first, second = rng.sample(range(52), 7), rng.sample(range(52), 7)
+            reference = (classify_hand(first) > classify_hand(second)) - (classify_hand(first) < classify_hand(second))
+            strength = (hand_strength(first) > hand_strength(second)) - (hand_strength(first) < hand_strength(second))
+            self.assertEqual(strength, reference)
+
+    def test_wheel_loses_to_six_high_straight(self):
+        wheel = hand_from_strs(['A♣', '2♦', '3♣', '4♠', '5♠', 'K♦', 'Q♣'])
+        six_high = hand_from_strs(['6♥', '2♦', '3♣', '4♠', '5♠', 'K♦', 'Q♣'])
+        self.assertLess(hand_strength(wheel), hand_strength(six_high))
+
+    def test_decode_strength(self):
+        royal = hand_from_strs(['T♠', 'J♠', 'Q♠', 'K♠', 'A♠', '2♦', '3♣'])
+        self.assertEqual(decode_strength(hand_strength(royal)), (9, [12, 11, 10, 9, 8]))
+
+    def test_tables_round_trip(self):
+        tables = build_tables()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "hand_ranks.bin")
+            write_tables(path, *tables)
+            mapped = map_tables(path)
+            self.assertIsNotNone(mapped)
+            for built, loaded in zip(tables, mapped):
+                self.assertEqual(built.tobytes(), loaded.tobytes())
+                loaded.release()
+
+    def test_missing_table_file(self):
+        self.assertIsNone(map_tables(os.path.join(tempfile.gettempdir(), "missing_hand_ranks.bin")))
+
+
+class TestPartialHand(unittest.TestCase):
+
+    def test_matches_hand_strength(self):
+        rng = random.Random(483)
+        for known in range(8):  # from nothing known to all 7 cards known
+            for _ in range(300):
+                hand = rng.sample(range(52), 7)
+                self.assertEqual(PartialHand(hand[:known]).strength(hand[known:]), hand_strength(hand))
+
+    def test_extend(self):
+        board = hand_from_strs(['Q♠', 'J♠', '2♥'])
+        partial = PartialHand(board).extend(hand_from_strs(['A♠', 'K♠']))
+        self.assertEqual(partial.strength(hand_from_strs(['T♠', '3♣'])),
+                         hand_strength(hand_from_strs(['A♠', 'K♠', 'Q♠', 'J♠', 'T♠', '2♥', '3♣'])))
+        self.assertEqual(PartialHand(board).suit_masks, [0, 0, 1, (1 << 10) | (1 << 9)])  # extend copies the masks
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestEvaluateHandsBatch(unittest.TestCase):
+
+    def test_matches_hand_strength(self):
+        rng = random.Random(482)
+        hands = [rng.sample(range(52), 7) for _ in range(2000)]
+        hands.append(hand_from_strs(['T♠', 'J♠', 'Q♠', 'K♠', 'A♠', '2♦', '3♣']))  # make sure a flush is covered
+        strengths = evaluate_hands_batch(np.array(hands))
+        self.assertEqual(strengths.shape, (len(hands),))
+        self.assertEqual(strengths.tolist(), [hand_strength(hand) for hand in hands])
+
+    def test_empty_batch(self):
+        self.assertEqual(evaluate_hands_batch(np.empty((0, 7), dtype=int)).shape, (0,))
+
+    def test_rejects_wrong_shape(self):
+        with self.assertRaises(AssertionError):
+            evaluate_hands_batch(np.zeros((3, 6), dtype=int))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,115 @@
+import os
+import random
+import tempfile
+import unittest
+from itertools import combinations
+from Deck import parse_hand
+import FlopIndex
+from FlopIndex import build_index, build_part, canonical_spots, key_cards, map_index, part_path, spot_key, spot_stats
+from PokerBot import PokerBot
+from PreflopTable import class_name
+
+
+SPOTS = [(["As", "Ks"], ["Qs", "Js", "2h"]), (["7c", "2d"], ["Ah", "Kh", "Qh"]), (["9h", "9d"], ["9c", "5s", "5d"]),
+         (["Ac", "Kc"], ["5c", "4c", "3c"]), (["Ac", "Kc"], ["Qc", "Jc", "3d"]), (["Qd", "Tc"], ["Kd", "5h", "9h"])]
+
+
+class TestSpots(unittest.TestCase):
+
+    def test_keys_round_trip_and_ignore_suits(self):
+        for hole, flop in SPOTS:
+            key = spot_key(parse_hand(hole), parse_hand(flop))
+            self.assertEqual(spot_key(*key_cards(key)), key)
+        self.assertEqual(spot_key(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2h"])),
+                         spot_key(parse_hand(["Kd", "Ad"]), parse_hand(["2c", "Qd", "Jd"])))
+
+    def test_canonical_spots_of_a_pair(self):
+        aces = [hand_class for hand_class in range(169) if class_name(hand_class) == "AA"]
+        keys = canonical_spots(aces)
+        hole = parse_hand(["As", "Ah"])  # any suits give the same spots
+        remaining = [card for card in range(52) if card not in hole]
+        self.assertEqual(keys, sorted({spot_key(hole, flop) for flop in combinations(remaining, 3)}))
+        self.assertLess(len(keys), 19600 // 2)
+
+    def test_equity_and_histogram(self):
+        for hole, flop, reference in [([51, 50], [1, 2, 3], 0.4152), ([51, 50], [49, 48, 1], 0.7626)]:
+            equity, histogram = spot_stats(hole, flop, 40000, random.Random(480))
+            self.assertAlmostEqual(equity, reference, delta=0.01)
+            self.assertEqual(sum(histogram), 1081)  # every turn and river
+        _, histogram = spot_stats(parse_hand(["9h", "9d"]), parse_hand(["9c", "5s", "5d"]), 100, random.Random(480))
+        self.assertEqual(histogram[:6], [0] * 6)  # a full house at least
+
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "flop_index.bin")
+        self.keys = sorted(spot_key(parse_hand(hole), parse_hand(flop)) for hole, flop in SPOTS)
+
+    def tearDown(self):
+        FlopIndex.load_index()  # back to the default index (if any)
+        self.directory.cleanup()
+
+    def test_lookup(self):
+        build_index(self.path, self.keys, samples=500, seed=480, chunk=2)
+        index = map_index(self.path)
+        self.assertEqual(len(index), len(SPOTS))
+        self.assertFalse(os.path.exists(self.path + ".parts"))
+        equity, samples, histogram = index.lookup(parse_hand(["Ad", "Kd"]), parse_hand(["Jd", "Qd", "2s"]))
+        self.assertEqual((samples, sum(histogram)), (500, 1081))
+        self.assertGreater(equity, 0.6)
+        self.assertIsNone(index.lookup(parse_hand(["As", "Ks"]), parse_hand(["Qs", "Js", "2s"])))
+
+    def test_resume_reuses_finished_chunks(self):
+        fresh_path = self.path + ".fresh"
+        build_index(fresh_path, self.keys, samples=200, seed=480, chunk=2)
+
+        # an interrupted build: the first chunk is already on disk (built with another seed to tell it apart)
+        os.makedirs(self.path + ".parts")
+        build_part(part_path(self.path + ".parts", 0), self.keys[:2], 200, 1)
+        build_index(self.path, self.keys, samples=200, seed=480, chunk=2)
+        fresh, resumed = list(map_index(fresh_path).equities), list(map_index(self.path).equities)
+        self.assertEqual(resumed[2:], fresh[2:])  # every chunk has the same seed in both builds
+        first = spot_stats(*key_cards(self.keys[0]), 200, random.Random(1))[0]
+        self.assertAlmostEqual(resumed[0], first, places=6)
+
+    def test_stale_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"PKFX" + bytes(20))
+        self.assertIsNone(map_index(self.path))
+        self.assertIsNone(map_index(os.path.join(self.directory.name, "missing.bin")))
+
+    def test_decide_consults_the_index(self):
+        build_index(self.path, self.keys, samples=500, seed=480, chunk=10)
+        FlopIndex.load_index(self.path)
+        bot = PokerBot()
+        bot.simulation_time_limit = None
+        bot.simulation_limit = 2000
+        self.assertEqual(bot.decide(parse_hand(["Ah", "Kh"]), parse_hand(["Qh", "Jh", "2c"])), "stay")
+        report = bot.last_report
+        self.assertEqual((report.method, report.simulations, sum(report.strength_histogram)), ("flop_index", 500, 1081))
+
+        bot.decide(parse_hand(["Ah", "Kh"]), parse_hand(["Qh", "Jh", "2h"]))  # not in the index
+        self.assertEqual(bot.last_report.method, "mcts")
+        bot.use_flop_index = False
+        bot.decide(parse_hand(["Ah", "Kh"]), parse_hand(["Qh", "Jh", "2c"]))
+        self.assertEqual(bot.last_report.method, "mcts")
+
+    def test_close_spots_fall_through_to_rollouts(self):
+        build_index(self.path, self.keys, samples=500, seed=480, chunk=10)
+        FlopIndex.load_index(self.path)
+        bot = PokerBot()
+        bot.simulation_time_limit = None
+        bot.simulation_limit = 2000
+        bot.seed, bot.confidence = 480, None  # the rollouts could settle early either way
+        hole, flop = parse_hand(["Qd", "Tc"]), parse_hand(["Kd", "5h", "9h"])  # exact equity 0.5108
+        equity, samples, _ = FlopIndex.flop_lookup(hole, flop)
+        self.assertAlmostEqual(equity, 0.5108, delta=0.06)
+        bot.decide(hole, flop)
+        report = bot.last_report
+        self.assertEqual((report.method, report.simulations, sum(report.strength_histogram)), ("mcts", 2000, 1081))
+
+
+if __name__ == "__main__":
+    unittest.main()
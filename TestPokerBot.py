@@ -1,15 +1,39 @@
+import math
+import random
 import unittest
-from PokerBot import simulate_game
+from itertools import combinations
+from Deck import COMBOS
+from Evaluator import classify_hand
+from PokerBot import MAX_OPPONENTS, PHASES, OpponentBandit, PokerBot, pot_share, simulate_game, wilson_interval
+from PreflopTable import preflop_equity
+
+
+def budget_bot(simulations=3000, time_limit=None):
+    """seeded bot with a fixed rollout and/ or time budget and no early stopping"""
+    bot = PokerBot()
+    bot.simulation_time_limit = time_limit
+    bot.simulation_limit = simulations
+    bot.confidence = None
+    bot.seed = 480
+    bot.use_flop_index = False  # the rollouts are what's tested
+    return bot
 
 
 class TestPokerBot(unittest.TestCase):
 
+    def play(self, my_hand, community_cards, opponent_hand, answer="stay"):
+        """headless game: the player always gives the same answer, no output, small rollout budget"""
+        bot = PokerBot()
+        bot.simulation_limit = 2000
+        return simulate_game(my_hand, community_cards, opponent_hand, ask=lambda prompt: answer,
+                             show=lambda *args: None, bot=bot)
+
     def test_draw(self):
         """draw-- both use all 5 community cards as hand"""
         my_hand = [51, 24]  # A♠ and K♦
         community_cards = [49, 48, 47, 46, 45]  # Q♠, J♠, T♠, 9♠, 8♠
         opponent_hand = [44, 27]  # 7♠ and 2♥
-        terminal_state = simulate_game(my_hand, community_cards, opponent_hand)
+        terminal_state = self.play(my_hand, community_cards, opponent_hand)
         self.assertEqual(terminal_state, 0.5)
 
     def test_win(self):
@@ -17,7 +41,7 @@ class TestPokerBot(unittest.TestCase):
         my_hand = [51, 50]  # A♠ and K♠
         community_cards = [49, 48, 47, 46, 45]  # Q♠, J♠, T♠, 9♠, 8♠
         opponent_hand = [44, 27]  # 7♠ and 2♥
-        terminal_state = simulate_game(my_hand, community_cards, opponent_hand)
+        terminal_state = self.play(my_hand, community_cards, opponent_hand)
         self.assertEqual(terminal_state, 1)
 
     def test_loss(self):
@@ -25,9 +49,339 @@ class TestPokerBot(unittest.TestCase):
         my_hand = [28, 41]  # 4♥ and 4♠
         community_cards = [31, 44, 11, 15, 2]  # 7♥, 7♠, K♣, 4♦, 4♣
         opponent_hand = [5, 18]  # 7♣ and 7♦
-        terminal_state = simulate_game(my_hand, community_cards, opponent_hand)
+        terminal_state = self.play(my_hand, community_cards, opponent_hand)
         self.assertEqual(terminal_state, 0)
 
+    def test_fold(self):
+        """fold-- the player folds before the flop"""
+        self.assertEqual(self.play([28, 41], [31, 44, 11, 15, 2], [5, 18], answer="fold"), -1)
+
+
+class TestExactWinRate(unittest.TestCase):
+
+    def test_count_evaluations(self):
+        bot = PokerBot()
+        self.assertEqual(bot.count_evaluations([51, 50], [0, 1, 2, 3, 4]), 1 + 990)  # river
+        self.assertEqual(bot.count_evaluations([51, 50], [0, 1, 2, 3]), 46 * (1 + 990))  # turn
+        self.assertGreater(bot.count_evaluations([51, 50], [0, 1, 2]), bot.enumeration_budget)  # flop
+
+    def test_board_plays(self):
+        """royal flush on the board-- every opponent hand ties"""
+        win_rate, outcomes = PokerBot().exact_win_rate([0, 14], [47, 48, 49, 50, 51])
+        self.assertEqual(win_rate, 0.5)
+        self.assertEqual(outcomes, 990)
+
+    def test_matches_reference_on_river(self):
+        my_hand = [28, 41]  # 4♥ and 4♠
+        community_cards = [31, 44, 11, 15, 2]  # 7♥, 7♠, K♣, 4♦, 4♣
+        remaining = [card for card in range(52) if card not in my_hand + community_cards]
+        my_class = classify_hand(my_hand + community_cards)
+        expected = 0
+        for opponent_hand in combinations(remaining, 2):
+            opponent_class = classify_hand(list(opponent_hand) + community_cards)
+            expected += 1 if my_class > opponent_class else 0.5 if my_class == opponent_class else 0
+        win_rate, outcomes = PokerBot().exact_win_rate(my_hand, community_cards)
+        self.assertAlmostEqual(win_rate, expected / outcomes)
+
+    def test_decide_enumerates_turn(self):
+        bot = PokerBot()
+        bot.simulation_time_limit = 0  # MCTS would have no time to run
+        bot.use_flop_index = False
+        self.assertEqual(bot.decide([51, 50], [49, 48, 1]), "fold")  # flop: no simulations -> win rate 0
+        self.assertEqual(bot.decide([51, 50], [49, 48, 1, 15]), "stay")  # turn: exact
+
+    def test_decide_preflop_table(self):
+        bot = PokerBot()
+        bot.simulation_time_limit = 0
+        if preflop_equity([51, 38]) is not None:
+            self.assertEqual(bot.decide([51, 38], []), "stay")  # A♠ A♥ from the table
+        bot.use_preflop_table = False
+        self.assertEqual(bot.decide([51, 38], []), "fold")  # MCTS with no simulations
+
+
+class TestParallelRollouts(unittest.TestCase):
+
+    def test_worker_seeds_reproducible(self):
+        bot = PokerBot()
+        bot.seed = 480
+        bot.num_workers = 4
+        seeds = bot.worker_seeds()
+        self.assertEqual(len(set(seeds)), 4)  # independent stream per worker
+        self.assertEqual(seeds, bot.worker_seeds())  # same master seed -> same streams
+
+    def test_process_pool(self):
+        bot = PokerBot()
+        bot.simulation_time_limit = 0.5
+        bot.num_workers = 2
+        bot.seed = 480
+        win_rate = bot.mcts_win_rate([51, 50], [49, 48, 1])  # A♠ K♠ on Q♠ J♠ 3♣
+        self.assertGreater(win_rate, 0.5)
+
+
+class TestOpponentBandit(unittest.TestCase):
+
+    def test_excludes_known_cards(self):
+        bandit = OpponentBandit({51, 50, 0}, random.Random(480))
+        self.assertEqual(len(bandit.arms), 1176)  # C(49, 2)
+        for combo_number in bandit.arms:
+            self.assertFalse({51, 50, 0} & set(COMBOS[combo_number]))
+
+    def test_visits_every_hand_first(self):
+        bandit = OpponentBandit(set(range(47)), random.Random(480))  # 5 cards left -> 10 opponent hands
+        selected = set()
+        for _ in range(10):
+            combo_number = bandit.select()
+            selected.add(combo_number)
+            bandit.update(combo_number, 0)
+        self.assertEqual(selected, set(bandit.arms))
+
+    def test_selects_best_ucb1(self):
+        bandit = OpponentBandit(set(range(47)), random.Random(480))
+        for _ in range(10):
+            combo_number = bandit.select()
+            bandit.update(combo_number, 1 if combo_number == bandit.arms[3] else 0)
+        self.assertEqual(bandit.select(), bandit.arms[3])  # same visits, only winning hand
+
+    def test_each_hand_counts_once(self):
+        bandit = OpponentBandit(set(range(48)), random.Random(480))  # 4 cards left -> 6 opponent hands
+        for _ in range(6):
+            bandit.update(bandit.select(), 0)
+        winner = bandit.select()
+        for _ in range(50):  # one hand visited far more than the others
+            bandit.update(winner, 1)
+        self.assertAlmostEqual(bandit.win_rate(), (50 / 51) / 6)
+
+    def test_balanced_passes(self):
+        bandit = OpponentBandit(set(range(47)), random.Random(480), explore=False)  # 10 opponent hands
+        for _ in range(3):
+            selected = []
+            for _ in range(10):
+                selected.append(bandit.select())
+                bandit.update(selected[-1], 1 if selected[-1] == bandit.arms[3] else 0)
+            self.assertEqual(sorted(selected), sorted(bandit.arms))  # every pass visits each hand once
+        self.assertAlmostEqual(bandit.win_rate(), 0.1)
+
+    def test_matches_full_ucb1_scan(self):
+        bandit = OpponentBandit(set(range(44)), random.Random(480))  # 8 cards left -> 28 opponent hands
+        rng = random.Random(481)
+        for _ in range(2000):
+            combo_number = bandit.select()
+            bandit.update(combo_number, rng.random() < (combo_number % 5) / 5)
+        log_simulations = math.log(bandit.total_simulations + 1)
+        best = max(bandit.ucb1(arm, log_simulations) for arm in bandit.arms)
+        self.assertAlmostEqual(bandit.ucb1(bandit.select(), log_simulations), best, delta=0.05)
+
+
+class TestSimulationBudget(unittest.TestCase):
+
+    def test_wilson_interval(self):
+        lower, upper = wilson_interval(950, 1000, 2.576)
+        self.assertLess(lower, 0.95)
+        self.assertGreater(upper, 0.95)
+        self.assertGreater(lower, 0.5)
+        self.assertEqual(wilson_interval(0, 0, 2.576), (0.0, 1.0))
+        narrow, wide = wilson_interval(500, 10000, 2.576), wilson_interval(50, 100, 2.576)
+        self.assertLess(narrow[1] - narrow[0], wide[1] - wide[0])
+
+    def test_simulation_limit(self):
+        bot = budget_bot(2000)
+        wins, visits, simulations, phase_times = bot.run_rollouts([51, 50], [49, 48, 1], float("inf"), random.Random(480), 2000)
+        self.assertEqual(simulations, 2000)
+        self.assertEqual(sum(visits), 2000)
+
+    def test_reproducible_with_seed(self):
+        bot = budget_bot(2000)
+        self.assertEqual(bot.mcts_win_rate([51, 50], [1, 2, 3]), bot.mcts_win_rate([51, 50], [1, 2, 3]))
+        bot.num_workers = 2
+        self.assertEqual(bot.mcts_win_rate([51, 50], [1, 2, 3]), bot.mcts_win_rate([51, 50], [1, 2, 3]))
+
+    def test_win_rate_accuracy(self):
+        bot = budget_bot(2000)
+        bot.simulation_limit = 30000
+        self.assertAlmostEqual(bot.mcts_win_rate([51, 50], [1, 2, 3]), 0.4152, delta=0.007)  # A♠ K♠ on 3♣ 4♣ 5♣
+
+    def test_default_decide_interval_covers_exact(self):
+        for my_hand, revealed_cards in [([51, 50], [1, 2, 3]), ([23, 8], [24, 29, 33]), ([26, 3], [39, 7, 21])]:
+            exact, _ = PokerBot().exact_win_rate(my_hand, revealed_cards)
+            for seed in range(3):
+                bot = PokerBot()
+                bot.simulation_time_limit = None
+                bot.simulation_limit = 20000
+                bot.seed = seed
+                decision = bot.decide(my_hand, revealed_cards)
+                lower, upper = bot.last_report.interval
+                self.assertLessEqual(lower, exact, msg=(my_hand, seed))
+                self.assertGreaterEqual(upper, exact, msg=(my_hand, seed))
+                self.assertEqual(decision, "stay" if exact >= 0.5 else "fold", msg=(my_hand, seed))
+
+    def test_early_stopping(self):
+        bot = budget_bot(2000)
+        bot.confidence = 0.99
+        wins, visits, simulations, phase_times = bot.run_rollouts([51, 50], [49, 48, 47], float("inf"), random.Random(480), 2000)
+        self.assertLess(simulations, 2000)  # A♠ K♠ on Q♠ J♠ T♠: royal flush, settled at once
+
+    def test_no_early_stopping_with_ucb(self):
+        bot = budget_bot(2000)
+        bot.confidence = 0.99
+        bot.sampling = "ucb"
+        bot.decide([23, 8], [24, 29, 33])  # exact 0.5108, ucb used to fold it after 1536 rollouts
+        self.assertEqual(bot.last_report.simulations, 2000)
+
+
+class TestMultipleOpponents(unittest.TestCase):
+
+    def test_opponent_limits(self):
+        bot = budget_bot(10)
+        bot.use_preflop_table = False
+        for num_opponents in (0, 9, 23, 2.0, True):
+            with self.assertRaises(ValueError, msg=num_opponents):
+                bot.decide([0, 1], [], num_opponents)
+        with self.assertRaises(ValueError):
+            bot.search([0, 1], [], 23)
+        bot.decide([0, 1], [], MAX_OPPONENTS)  # a full table still deals
+        self.assertEqual(bot.last_report.simulations, 10)
+
+    def test_pot_share(self):
+        self.assertEqual(pot_share(10, [3, 9, 5]), 1)
+        self.assertEqual(pot_share(4, [3, 9, 5]), 0)
+        self.assertEqual(pot_share(9, [3, 9, 5]), 0.5)
+        self.assertAlmostEqual(pot_share(9, [9, 9, 5]), 1 / 3)
+
+    def test_evaluate_showdown(self):
+        community_cards = [49, 48, 47, 46, 45]  # Q♠, J♠, T♠, 9♠, 8♠
+        bot = PokerBot()
+        self.assertEqual(bot.evaluate_showdown([51, 50], [[44, 27], [0, 1]], community_cards), 1)  # royal flush
+        self.assertAlmostEqual(bot.evaluate_showdown([0, 14], [[1, 2], [15, 16]], community_cards), 1 / 3)  # board plays
+
+    def test_win_threshold(self):
+        bot = PokerBot()
+        self.assertEqual(bot.win_threshold(1), 0.5)
+        self.assertAlmostEqual(bot.win_threshold(2), 1 / 3)
+
+    def test_aces_against_two_opponents(self):
+        bot = PokerBot()
+        bot.simulation_time_limit = None
+        bot.simulation_limit = 30000
+        bot.confidence = None
+        bot.seed = 480
+        self.assertEqual(bot.decide([51, 38], [], num_opponents=2), "stay")
+        report = bot.last_report
+        self.assertEqual((report.method, report.num_opponents, report.simulations), ("mcts", 2, 30000))
+        self.assertAlmostEqual(report.win_rate, 0.735, delta=0.03)  # A♠ A♥ against two random hands
+
+    def test_river_uses_rollouts(self):
+        bot = PokerBot()
+        bot.simulation_time_limit = None
+        bot.simulation_limit = 2000
+        bot.decide([51, 50], [49, 48, 47, 1, 2], num_opponents=3)
+        self.assertEqual(bot.last_report.method, "mcts")
+        self.assertEqual(bot.last_report.win_rate, 1)  # royal flush can't lose
+
+
+class TestDecisionReport(unittest.TestCase):
+
+    def test_mcts_report(self):
+        bot = budget_bot()
+        decision = bot.decide([51, 50], [1, 2, 3])
+        report = bot.last_report
+        self.assertEqual((report.street, report.method, report.decision), ("flop", "mcts", decision))
+        self.assertEqual(report.simulations, 3000)
+        self.assertEqual(report.opponent_hands, 1081)  # every hand visited once before ucb1 repeats any
+        self.assertLessEqual(report.interval[0], report.win_rate)
+        self.assertGreaterEqual(report.interval[1], report.win_rate)
+        self.assertGreater(report.rollouts_per_second(), 0)
+        self.assertIsNone(report.phase_times)  # no hook -> no timing
+
+    def test_hook_records_phases(self):
+        bot = budget_bot()
+        reports = []
+        bot.telemetry = reports.append
+        bot.decide([51, 50], [1, 2, 3])
+        bot.decide([51, 50], [1, 2, 3, 4])
+        self.assertEqual([report.method for report in reports], ["mcts", "exact"])
+        self.assertEqual(set(reports[0].phase_times), set(PHASES))
+        self.assertLessEqual(sum(reports[0].phase_times.values()), reports[0].elapsed)
+        self.assertEqual(reports[1].interval, (reports[1].win_rate, reports[1].win_rate))
+        self.assertIn("turn exact", reports[1].summary())
+
+
+class TestAnytimeDecide(unittest.TestCase):
+
+    def test_progressive_reports(self):
+        bot = budget_bot(None, 0.3)
+        reports = list(bot.decide_iter([51, 50], [1, 2, 3], report_interval=0.05))
+        self.assertGreater(len(reports), 2)
+        simulations = [report.simulations for report in reports]
+        self.assertEqual(simulations, sorted(simulations))
+        self.assertLess(reports[-1].elapsed, 0.5)
+        self.assertIs(bot.last_report, reports[-1])
+
+    def test_simulation_budget_per_call(self):
+        bot = budget_bot()
+        reports = list(bot.decide_iter([51, 50], [1, 2, 3]))
+        self.assertEqual(reports[-1].simulations, 3000)
+
+    def test_resume_refines(self):
+        bot = budget_bot()
+        state = bot.search([51, 50], [1, 2, 3])
+        first = list(bot.decide_iter([51, 50], [1, 2, 3], state=state))[-1]
+        second = list(bot.decide_iter([51, 50], [1, 2, 3], state=state))[-1]
+        self.assertEqual((first.simulations, second.simulations), (3000, 6000))
+        self.assertLess(second.interval[1] - second.interval[0], first.interval[1] - first.interval[0])
+
+    def test_resume_settled_search(self):
+        bot = budget_bot(None, 10)
+        bot.confidence = 0.99
+        state = bot.search([51, 50], [49, 48, 47])  # royal flush: settled at the first check
+        first = list(bot.decide_iter([51, 50], [49, 48, 47], state=state))[-1]
+        second = list(bot.decide_iter([51, 50], [49, 48, 47], state=state))[-1]
+        self.assertEqual(first.simulations, bot.min_simulations + 24)  # first multiple of stop_check_interval
+        self.assertEqual(second.simulations, first.simulations + bot.stop_check_interval)
+
+    def test_stop_early_and_resume(self):
+        bot = budget_bot(None, 10)
+        state = bot.search([51, 50], [1, 2, 3])
+        for report in bot.decide_iter([51, 50], [1, 2, 3], report_interval=0.01, state=state):
+            if report.simulations >= 500:
+                break  # good enough
+        self.assertLess(state.elapsed, 5)
+        bot.simulation_time_limit = None
+        bot.simulation_limit = 100
+        resumed = list(bot.decide_iter([51, 50], [1, 2, 3], state=state))[-1]
+        self.assertEqual(resumed.simulations, report.simulations + 100)
+
+    def test_cancel(self):
+        class Cancelled:
+            def is_set(self):
+                return True
+
+        bot = budget_bot(None, 10)
+        reports = []
+        bot.telemetry = reports.append
+        self.assertEqual(len(list(bot.decide_iter([51, 50], [1, 2, 3], report_interval=0.01, cancel=Cancelled()))), 1)
+        self.assertEqual(len(reports), 1)  # telemetry gets the final report only
+
+    def test_table_and_exact_yield_once(self):
+        bot = budget_bot()
+        self.assertEqual([report.method for report in bot.decide_iter([51, 50], [])], ["preflop_table"])
+        self.assertEqual([report.method for report in bot.decide_iter([51, 50], [1, 2, 3, 4])], ["exact"])
+
+    def test_balanced_or_ucb_only(self):
+        bot = budget_bot()
+        bot.sampling = "stratified"
+        with self.assertRaises(AssertionError):
+            bot.search([51, 50], [1, 2, 3])
+        with self.assertRaises(AssertionError):
+            next(bot.decide_iter([51, 50], [1, 2, 3]))
+        bot.sampling = "ucb"
+        self.assertEqual(list(bot.decide_iter([51, 50], [1, 2, 3]))[-1].simulations, 3000)
+
+    def test_state_of_another_decision_point(self):
+        bot = budget_bot()
+        state = bot.search([51, 50], [1, 2, 3])
+        with self.assertRaises(AssertionError):
+            next(bot.decide_iter([51, 50], [1, 2, 4], state=state))
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import os
+import random
+import tempfile
+import unittest
+from PreflopTable import (NUM_CLASSES, TABLE, starting_hand_class, class_name, class_hole_cards, simulate_equity,
+                          build_table, write_table, read_table, preflop_equity)
+
+
+class TestStartingHandClass(unittest.TestCase):
+
+    def test_every_class_is_distinct(self):
+        self.assertEqual(len({class_name(hand_class) for hand_class in range(NUM_CLASSES)}), NUM_CLASSES)
+        for hand_class in range(NUM_CLASSES):
+            self.assertEqual(starting_hand_class(class_hole_cards(hand_class)), hand_class)
+
+    def test_class_names(self):
+        self.assertEqual(class_name(starting_hand_class([51, 50])), "AKs")  # A♠ K♠
+        self.assertEqual(class_name(starting_hand_class([50, 38])), "AKo")  # K♠ A♥
+        self.assertEqual(class_name(starting_hand_class([5, 13])), "72o")  # 7♣ 2♦
+        self.assertEqual(class_name(starting_hand_class([8, 21])), "TT")  # T♣ T♦
+
+    def test_suit_relabelling(self):
+        self.assertEqual(starting_hand_class([51, 50]), starting_hand_class([12, 11]))  # A♠ K♠ ~ A♣ K♣
+
+
+class TestTableFile(unittest.TestCase):
+
+    def test_round_trip(self):
+        table = build_table(10, seed=480)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "preflop_equity.bin")
+            write_table(path, table, 10)
+            self.assertEqual(read_table(path), table)
+
+    def test_missing_table(self):
+        self.assertIsNone(read_table(os.path.join(tempfile.gettempdir(), "missing_preflop_equity.bin")))
+
+
+@unittest.skipIf(TABLE is None, "no preflop table, run: python PreflopTable.py build")
+class TestTableAccuracy(unittest.TestCase):
+
+    def test_reference_values(self):
+        self.assertAlmostEqual(preflop_equity([51, 38]), 0.852, delta=0.003)  # AA
+        self.assertAlmostEqual(preflop_equity([51, 50]), 0.670, delta=0.003)  # AKs
+        self.assertAlmostEqual(preflop_equity([5, 13]), 0.346, delta=0.003)  # 72o
+
+    def test_matches_monte_carlo(self):
+        rng = random.Random(480)
+        for hand_class in rng.sample(range(NUM_CLASSES), 5):
+            equity = simulate_equity(class_hole_cards(hand_class), 20000, rng)
+            self.assertAlmostEqual(TABLE[hand_class], equity, delta=0.015)
+
+
+if __name__ == "__main__":
+    unittest.main()
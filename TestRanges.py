@@ -0,0 +1,116 @@
+import pickle
+import random
+import unittest
+from collections import Counter
+from Deck import COMBOS, CardSet, parse_hand
+from EquityCache import EquityCache
+from PokerBot import PokerBot
+from Ranges import AliasTable, Range, parse_token
+
+
+class TestNotation(unittest.TestCase):
+
+    def test_combo_counts(self):
+        for text, count in [("TT+", 30), ("AQs+", 8), ("AK", 16), ("AKo", 12), ("22-55", 24), ("A5s-A2s", 16),
+                            ("AsKs", 1), ("TT+, AQs+, AK", 50)]:
+            self.assertEqual(len(Range.from_notation(text)), count, text)
+
+    def test_plus_raises_the_kicker(self):
+        hands = {tuple(sorted(card % 13 for card in COMBOS[combo])) for combo in parse_token("AQs+")}
+        self.assertEqual(hands, {(10, 12), (11, 12)})
+
+    def test_weights(self):
+        weights = Range.from_notation("AA, KK:0.5, KhKs:0").weights
+        self.assertEqual(sorted(Counter(weights).items()), [(0.0, 1326 - 12 + 1), (0.5, 5), (1.0, 6)])
+
+    def test_bad_tokens(self):
+        for text in ("AAs", "AKx", "XK", "AKs-QJs", "AsAs", "AK:-1"):
+            with self.assertRaises(ValueError, msg=text):
+                Range.from_notation(text)
+
+
+class TestAliasTable(unittest.TestCase):
+
+    def test_distribution(self):
+        table = AliasTable([7, 8, 9], [1, 2, 5])
+        rng = random.Random(480)
+        counts = Counter(table.sample(rng.random) for _ in range(80000))
+        for combo, weight in [(7, 1), (8, 2), (9, 5)]:
+            self.assertAlmostEqual(counts[combo] / 80000, weight / 8, delta=0.01)
+
+    def test_equal_weights_draw_like_uniform(self):
+        table = AliasTable(list(range(10)), [3] * 10)
+        self.assertEqual([table.sample(random.Random(seed).random) for seed in range(20)],
+                         [int(random.Random(seed).random() * 10) for seed in range(20)])
+
+
+class TestCardRemoval(unittest.TestCase):
+
+    def test_blocked_hands_are_removed(self):
+        aces = Range.from_notation("AA")
+        self.assertEqual(len(aces.alias(CardSet(parse_hand(["As"]))).combos), 3)
+        self.assertEqual(len(aces.alias(CardSet(parse_hand(["As", "Ah"]))).combos), 1)
+        self.assertEqual(len(aces.alias(CardSet(parse_hand(["2c"]))).combos), 6)  # new hand: full range again
+        with self.assertRaises(ValueError):
+            aces.alias(CardSet(parse_hand(["As", "Ah", "Ad"])))
+
+    def test_table_is_reused_until_the_board_changes(self):
+        hands = Range.from_notation("TT+, AQs+")
+        known = CardSet(parse_hand(["Js", "Jh", "2c", "7d", "9s"]))
+        table = hands.alias(known)
+        self.assertIs(hands.alias(CardSet(parse_hand(["Js", "Jh", "2c", "7d", "9s"]))), table)
+        turn = hands.alias(known | CardSet(parse_hand(["Qs"])))
+        self.assertIsNot(turn, table)
+        self.assertEqual(len(turn.combos), len(table.combos) - 3 - 1)  # QsQx and AsQs
+
+    def test_pickles_without_table(self):
+        hands = Range.from_notation("AA")
+        hands.alias(CardSet(parse_hand(["As"])))
+        copy = pickle.loads(pickle.dumps(hands))
+        self.assertIsNone(copy.table)
+        self.assertEqual(len(copy.alias(CardSet()).combos), 6)
+
+
+class TestBotWithRange(unittest.TestCase):
+
+    def setUp(self):
+        self.my_hand = parse_hand(["Js", "Jh"])
+        self.flop = parse_hand(["2c", "7d", "9s"])
+        self.bot = PokerBot()
+        self.bot.simulation_time_limit = None
+        self.bot.confidence = None
+        self.bot.simulation_limit = 5000
+
+    def test_full_range_matches_uniform_exact(self):
+        turn = self.flop + parse_hand(["Kc"])
+        self.assertAlmostEqual(self.bot.exact_win_rate(self.my_hand, turn, Range().weights)[0],
+                               self.bot.exact_win_rate(self.my_hand, turn)[0])
+
+    def test_range_rollouts_match_weighted_exact(self):
+        self.bot.opponent_range = Range.from_notation("TT+, AQs+, AK, 76s:0.5")
+        exact, _ = self.bot.exact_win_rate(self.my_hand, self.flop, self.bot.opponent_range.weights)
+        for sampling in ("uniform", "stratified"):
+            self.bot.sampling = sampling
+            self.bot.simulation_limit = 20000
+            self.bot.seed = 480
+            self.assertAlmostEqual(self.bot.mcts_win_rate(self.my_hand, self.flop), exact, delta=0.02, msg=sampling)
+
+    def test_decide_skips_table_and_cache(self):
+        self.bot.opponent_range = Range.from_notation("AA")
+        self.bot.cache = EquityCache()
+        self.assertEqual(self.bot.decide(parse_hand(["Ks", "Kh"]), []), "fold")  # kings are ahead of a random hand
+        self.assertEqual(self.bot.last_report.method, "mcts")
+        self.assertEqual(self.bot.decide(self.my_hand, self.flop + parse_hand(["Kc", "3h"])), "fold")
+        self.assertEqual(self.bot.last_report.method, "exact")
+        self.assertEqual(self.bot.last_report.opponent_hands, 6)
+        self.assertEqual(self.bot.cache.stats()["entries"], 0)
+
+    def test_multiway_range(self):
+        self.bot.opponent_range = Range.from_notation("22+, A2s+")
+        self.bot.simulation_limit = 2000
+        self.bot.seed = 480
+        self.assertLess(self.bot.mcts_win_rate(parse_hand(["3s", "3h"]), self.flop, None, 3), 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
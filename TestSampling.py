@@ -0,0 +1,145 @@
+import math
+import random
+import unittest
+from itertools import combinations
+from Deck import COMBOS, CardSet
+from Evaluator import PartialHand
+from PokerBot import PokerBot
+from Sampling import StrataStats, StratifiedDraws, strength_percentiles
+from TestPokerBot import budget_bot
+
+
+def add(stats, stratum, result):
+    stats.counts[stratum] += 1
+    stats.sums[stratum] += result
+    stats.squares[stratum] += result * result
+
+
+class TestStrataStats(unittest.TestCase):
+
+    def test_single_stratum_is_the_plain_mean(self):
+        stats = StrataStats(1)
+        for result in [1, 0, 0.5, 1]:
+            add(stats, 0, result)
+        win_rate, standard_error = stats.estimate([1])
+        self.assertAlmostEqual(win_rate, 0.625)
+        self.assertAlmostEqual(standard_error, math.sqrt((0.375 ** 2 * 2 + 0.625 ** 2 + 0.125 ** 2) / 3 / 4))
+
+    def test_weights_and_merge(self):
+        stats, other = StrataStats(3), StrataStats(3)
+        add(stats, 0, 1)
+        add(stats, 0, 1)
+        add(other, 1, 0)
+        add(other, 1, 0)
+        add(other, 1, 0)
+        stats.merge(other)
+        self.assertEqual(stats.simulations(), 5)
+        win_rate, standard_error = stats.estimate([0.25, 0.75, 1])  # stratum 2 unvisited: left out
+        self.assertAlmostEqual(win_rate, 0.25)
+        self.assertEqual(standard_error, 0)  # no variance within the strata
+
+    def test_control_variate(self):
+        # results a linear function of the control: the adjustment removes all of their variance
+        stats = StrataStats(2, control=True)
+        for stratum, control in [(0, 0.1), (0, 0.9), (0, 0.5), (1, 0.2), (1, 0.6)]:
+            add(stats, stratum, 0.2 + 0.5 * control)
+            stats.controls[stratum] += control
+            stats.control_squares[stratum] += control * control
+            stats.products[stratum] += control * (0.2 + 0.5 * control)
+        self.assertAlmostEqual(stats.slope(), 0.5)
+        win_rate, standard_error = stats.estimate([1, 1], control_mean=0.5)
+        self.assertAlmostEqual(win_rate, 0.45)  # the result at the control's known mean
+        self.assertAlmostEqual(standard_error, 0)
+        self.assertNotAlmostEqual(stats.estimate([1, 1])[0], 0.45)
+
+    def test_empty(self):
+        self.assertEqual(StrataStats(2).estimate([1, 1]), (0, 0.5))
+
+
+class TestStratifiedDraws(unittest.TestCase):
+
+    def test_covers_every_stratum_once(self):
+        known_cards = CardSet(range(44))  # 8 cards left -> 28 opponent hands, 6 first cards each
+        remaining_cards = list(known_cards.complement())
+        arms = [combo_number for combo_number, combo in enumerate(COMBOS) if known_cards.isdisjoint(CardSet(combo))]
+        draws = StratifiedDraws(arms, COMBOS, remaining_cards, 2, random.Random(480))
+        strata = []
+        for _ in range(6):
+            single_pass = [draws.next() for _ in arms]
+            self.assertEqual(sorted(combo_number for combo_number, _ in single_pass), arms)
+            strata += single_pass
+        for combo_number, first_card in strata:
+            self.assertIn(first_card, remaining_cards)
+            self.assertNotIn(first_card, COMBOS[combo_number])
+        self.assertEqual(len(set(strata)), 28 * 6)
+
+    def test_river_has_no_first_card(self):
+        draws = StratifiedDraws([0, 1], COMBOS, [10, 11, 12], 0, random.Random(480))
+        self.assertIsNone(draws.next()[1])
+
+
+class TestStrengthPercentiles(unittest.TestCase):
+
+    def test_mean_is_one_half(self):
+        my_hand, revealed_cards = [51, 50], [49, 48, 1]
+        percentiles = strength_percentiles(my_hand, revealed_cards)
+        strengths = sorted(percentiles)
+        self.assertEqual([percentiles[strength] for strength in strengths], sorted(percentiles.values()))
+        my_partial = PartialHand(my_hand + revealed_cards)
+        runouts = list(combinations(CardSet(my_hand + revealed_cards).complement(), 2))
+        mean = sum(percentiles[my_partial.strength(runout)] for runout in runouts) / len(runouts)
+        self.assertAlmostEqual(mean, 0.5)
+
+    def test_over_budget(self):
+        self.assertIsNone(strength_percentiles([51, 50], [], budget=100000))  # 2.1M preflop runouts
+
+
+class TestSamplingModes(unittest.TestCase):
+
+    def sampling_bot(self, mode, simulations=20000):
+        bot = budget_bot(simulations)
+        bot.sampling = mode
+        return bot
+
+    def test_modes_match_exact(self):
+        exact, _ = PokerBot().exact_win_rate([51, 50], [49, 48, 1])
+        for mode in ("uniform", "stratified", "control"):
+            bot = self.sampling_bot(mode)
+            bot.enumeration_budget = 0  # force rollouts (control still enumerates its strength buckets)
+            bot.decide([51, 50], [49, 48, 1])
+            report = bot.last_report
+            self.assertEqual((report.method, report.simulations), ("mcts", 20000))
+            self.assertAlmostEqual(report.win_rate, exact, delta=0.015, msg=mode)
+            self.assertLess(report.interval[0], report.win_rate)
+            self.assertGreater(report.interval[1], report.win_rate)
+
+    def test_multiple_opponents_and_workers(self):
+        bot = self.sampling_bot("stratified", 4000)
+        bot.num_workers = 2
+        bot.decide([51, 38], [1, 2, 3], 3)
+        self.assertEqual(bot.last_report.simulations, 4000)
+        self.assertGreater(bot.last_report.win_rate, 0.25)  # aces beat the fair share of 4 players
+
+    def test_control_narrows_interval(self):
+        widths = {}
+        for mode in ("uniform", "control"):
+            bot = self.sampling_bot(mode)
+            bot.decide([51, 50], [49, 48, 1, 5], 2)
+            widths[mode] = bot.last_report.interval[1] - bot.last_report.interval[0]
+        self.assertLess(widths["control"], widths["uniform"])
+
+    def test_early_stopping(self):
+        bot = self.sampling_bot("stratified", None)
+        bot.simulation_time_limit = 10
+        bot.confidence = 0.99
+        bot.enumeration_budget = 0
+        bot.decide([51, 38], [12, 25, 1])  # quad aces
+        self.assertLess(bot.last_report.simulations, 5000)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(AssertionError):
+            self.sampling_bot("antithetic").decide([51, 50], [49, 48, 1], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
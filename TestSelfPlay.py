@@ -0,0 +1,91 @@
+import io
+import unittest
+from unittest import mock
+from SelfPlay import AlwaysStay, MatchStats, make_policy, play_hand, run_match, main
+
+
+class AlwaysFold:
+
+    def decide(self, my_hand, revealed_cards, num_opponents=1):
+        return "fold"
+
+
+class FoldOnTurn:
+
+    def decide(self, my_hand, revealed_cards, num_opponents=1):
+        return "fold" if len(revealed_cards) == 4 else "stay"
+
+
+ROYAL_FLUSH = [51, 50]  # A♠ K♠
+STRAIGHT_FLUSH = [44, 27]  # 7♠ 2♥
+BOARD = [49, 48, 47, 46, 45]  # Q♠ J♠ T♠ 9♠ 8♠
+
+
+def totals(stats):
+    return stats.hands, stats.outcomes, stats.chips, stats.chip_squares
+
+
+class TestPlayHand(unittest.TestCase):
+
+    def test_showdown(self):
+        self.assertEqual(play_hand(AlwaysStay(), AlwaysStay(), ROYAL_FLUSH, STRAIGHT_FLUSH, BOARD), (4, "win"))
+        self.assertEqual(play_hand(AlwaysStay(), AlwaysStay(), STRAIGHT_FLUSH, ROYAL_FLUSH, BOARD), (-4, "loss"))
+        self.assertEqual(play_hand(AlwaysStay(), AlwaysStay(), [0, 1], [13, 14], [51, 50, 49, 48, 47]), (0, "tie"))
+
+    def test_folds(self):
+        self.assertEqual(play_hand(AlwaysFold(), AlwaysStay(), ROYAL_FLUSH, STRAIGHT_FLUSH, BOARD), (-1, "a_fold"))
+        self.assertEqual(play_hand(AlwaysStay(), FoldOnTurn(), STRAIGHT_FLUSH, ROYAL_FLUSH, BOARD), (3, "b_fold"))
+        self.assertEqual(play_hand(AlwaysFold(), AlwaysFold(), ROYAL_FLUSH, STRAIGHT_FLUSH, BOARD), (0, "both_fold"))
+
+
+class TestPolicies(unittest.TestCase):
+
+    def test_specs(self):
+        self.assertEqual(make_policy("table:0.6", None).threshold, 0.6)
+        self.assertEqual(make_policy("random:0.7", None).stay_probability, 0.7)
+        self.assertEqual(make_policy("mcts:50", None).bot.simulation_limit, 50)
+        with self.assertRaises(ValueError):
+            make_policy("bluff", None)
+
+    def test_table_policy(self):
+        table = make_policy("table", None)
+        self.assertEqual(table.decide([51, 38], BOARD), "stay")  # aces
+        self.assertEqual(table.decide([5, 13], []), "fold")  # 7-2 offsuit
+
+
+class TestMatch(unittest.TestCase):
+
+    def test_duplicate_deals_cancel_out(self):
+        stats = list(run_match("stay", "stay", 200, seed=480))[-1]
+        self.assertEqual(stats.hands, 400)
+        self.assertEqual(stats.chips, 0)
+        self.assertEqual(stats.outcomes["win"], stats.outcomes["loss"])
+
+    def test_reproducible_across_workers(self):
+        single = list(run_match("table", "random:0.6", 300, workers=1, seed=480, chunk=100))[-1]
+        pooled = list(run_match("table", "random:0.6", 300, workers=2, seed=480, chunk=100))[-1]
+        self.assertEqual(totals(single), totals(pooled))
+
+    def test_streams_progress(self):
+        progress = [stats.hands for stats in run_match("mcts:50", "stay", 30, seed=480, chunk=10, duplicate=False)]
+        self.assertEqual(progress, [10, 20, 30])
+
+    def test_summary(self):
+        stats = MatchStats()
+        stats.add(4, "win")
+        stats.add(-1, "a_fold")
+        stats.add(0, "both_fold")
+        wins, decided = stats.score()
+        self.assertEqual((wins, decided), (1, 2))
+        self.assertIn("3 hands", stats.summary("a", "b", elapsed=1.0))
+        self.assertIn("3 hands/s", stats.summary("a", "b", elapsed=1.0))
+
+    def test_cli(self):
+        sink = io.StringIO()
+        with mock.patch("sys.stdout", sink):
+            self.assertEqual(main(["stay", "table", "random", "--hands", "50", "--workers", "1", "--seed", "480"]), 0)
+        self.assertEqual(len(sink.getvalue().splitlines()), 3)  # one match per pair
+
+
+if __name__ == "__main__":
+    unittest.main()